@@ -5,27 +5,73 @@ from werkzeug import Response
 import authenticator
 import config
 from pages import editor, viewer, writer
-from data_handler import init_database
+from layouts import home_layout, login_layout, navbar
+from auth_routes import auth_bp
+from data_handler import ensure_database
 from dash import html, dcc, Input, Output, State
 import flask
-from flask_login import LoginManager, UserMixin, login_user, logout_user, current_user
+from flask.sessions import SecureCookieSessionInterface
+from flask_login import LoginManager, UserMixin, login_user, current_user
 from datetime import timedelta
 import pyotp
-
-# Initialize database using the function from data_handler.py
-init_database()
+import time
+import re
 
 # --- CONFIGURATION ---
+# Paths served identically to every visitor, kept free of session cookies so they can be cached
+PUBLIC_PATH_PREFIXES = ('/login', '/assets/', '/_dash-component-suites/', '/_dash-layout', '/_dash-dependencies')
+
+class PublicPathSessionInterface(SecureCookieSessionInterface):
+    """
+    Cookie session interface that leaves public responses untouched.
+    
+    For paths in PUBLIC_PATH_PREFIXES the session is never saved, so these
+    responses carry neither ``Set-Cookie`` nor ``Vary: Cookie`` and remain
+    cacheable by browsers and proxies.
+    """
+    def save_session(self, app, session, response) -> None:
+        """
+        Save the session cookie, except on public paths.
+        
+        Args:
+            app (flask.Flask): The application
+            session (SecureCookieSession): Session of the current request
+            response (Response): The outgoing response
+            
+        Returns:
+            None
+        """
+        if flask.request.path.startswith(PUBLIC_PATH_PREFIXES):
+            return
+        super().save_session(app, session, response)
+
 server = flask.Flask(__name__)
+server.session_interface = PublicPathSessionInterface()
 server.config.update(
     SECRET_KEY=authenticator.get_server_secret_key(),
     REMEMBER_COOKIE_DURATION=timedelta(days=30)
 )
+server.register_blueprint(auth_bp)
+
+@server.before_request
+def init_database_once() -> None:
+    """
+    Initialize the database before the first request served by this worker.
+    
+    Keeps the database setup off the import path; ensure_database returns
+    immediately once the database has been initialized.
+    
+    Returns:
+        None
+    """
+    ensure_database()
 
 # --- FLASK LOGIN ---
 login_manager = LoginManager()
 login_manager.init_app(server)
 login_manager.login_view = "/login"
+# Fresh logins are never required, so skip hashing the client identity on every request
+login_manager.session_protection = None
 
 class User(UserMixin):
     """
@@ -38,6 +84,10 @@ class User(UserMixin):
     """
     def __init__(self, id): self.id = id
 
+# Single-user application: the allowed account is resolved once at startup
+_ALLOWED_USER_ID = authenticator.get_user()[0]
+_CACHED_USER = User(_ALLOWED_USER_ID)
+
 @login_manager.user_loader
 def load_user(user_id):
     """
@@ -52,10 +102,70 @@ def load_user(user_id):
     Returns:
         User or None: The user object if found, None otherwise
     """
-    return User(user_id) if user_id == authenticator.get_user()[0] else None
+    return _CACHED_USER if user_id == _ALLOWED_USER_ID else None
 
 # --- APP DASH ---
-app = dash.Dash(__name__, title= "Pierre Seroul", server=server, suppress_callback_exceptions=True)
+class PrecompiledIndexDash(dash.Dash):
+    """
+    Dash application that prepares its index template once.
+    
+    The static placeholders (metas, title, favicon, css) are substituted a
+    single time and the template is split around the per-page ones, so
+    rendering the index only joins precomputed chunks. The chunks are rebuilt
+    whenever the template or one of the static values changes.
+    """
+    _STATIC_SLOTS = ('metas', 'title', 'favicon', 'css')
+    _DYNAMIC_SLOTS_RE = re.compile(r'\{%(app_entry|config|scripts|renderer)%\}')
+    _index_parts: tuple[tuple[str, ...], list[str]] | None = None
+
+    def interpolate_index(self, **kwargs) -> str:
+        """
+        Render the index page from the precomputed template chunks.
+        
+        Args:
+            **kwargs: Values of the index placeholders, as passed by Dash
+                (metas, title, favicon, css, app_entry, config, scripts, renderer)
+                
+        Returns:
+            str: The rendered index HTML
+        """
+        static = [kwargs.get(slot, '') for slot in self._STATIC_SLOTS]
+        key = (self.index_string, *static)
+        if self._index_parts is None or self._index_parts[0] != key:
+            template = self.index_string
+            for slot, value in zip(self._STATIC_SLOTS, static):
+                template = template.replace('{%' + slot + '%}', value)
+            # Even items are literal chunks, odd items the names of per-page slots
+            self._index_parts = (key, self._DYNAMIC_SLOTS_RE.split(template))
+        parts = self._index_parts[1]
+        return ''.join(kwargs.get(part, '') if i % 2 else part for i, part in enumerate(parts))
+
+app = PrecompiledIndexDash(__name__, title= "Pierre Seroul", server=server, suppress_callback_exceptions=True, compress=True)
+
+@server.after_request
+def set_static_cache_headers(response: Response) -> Response:
+    """
+    Mark versioned static files as cacheable for a year.
+    
+    Applies to assets requested with Dash's ``?m=<mtime>`` cache buster and to
+    fingerprinted component bundles, whose URLs change whenever the content does.
+    
+    Args:
+        response (Response): The outgoing response
+        
+    Returns:
+        Response: The response with long-lived cache headers when applicable
+    """
+    path = flask.request.path
+    if response.status_code == 200 and (
+        (path.startswith('/assets/') and 'm' in flask.request.args)
+        or (path.startswith('/_dash-component-suites/') and response.cache_control.max_age)
+    ):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+    return response
 
 app.index_string = '''
 <!DOCTYPE html>
@@ -80,75 +190,16 @@ app.index_string = '''
 </html>
 '''
 
+# Static trees built once and reused for every navigation, callables are built per visit
+_NAVBAR = navbar()
+_ROUTES = {
+    '/edit': editor.layout,
+    '/viz': viewer.layout,
+    '/writer': writer.layout,
+}
 
-# Layout de base
 app.layout = html.Div([
-    dcc.Location(id='url', refresh=True),
-    html.Div(id='page-content')
-])
-
-home_layout = html.Div([
-    html.Div([
-        html.H1("Idea manager"),
-        html.P("Welcome to the main interface", className="subtitle"),
-        html.Div([
-            html.Div([
-                html.H3("Edition"),
-                html.P("Access to Edition to add new ideas/notes."),
-                dcc.Link("Add note", href="/edit", className="btn-secondary")
-            ], className="card"),
-            html.Div([
-                html.H3("Viewer"),
-                html.P("Visualize database and navigate into ideas."),
-                dcc.Link("Navigate", href="/viz", className="btn-secondary")
-            ], className="card"),
-            html.Div([
-                html.H3("Writer"),
-                html.P("Write a white paper based on ideas."),
-                dcc.Link("Write", href="/writer", className="btn-secondary")
-            ], className="card"),
-        ], className="grid-2")
-    ], className="content-container")
-])
-
-login_layout = html.Div([
-    html.Div([
-        html.H2("Secured Access"),
-        html.P("Identify yourself to access", className="subtitle"),
-        html.Div([
-            dcc.Input(id='email', type='text', placeholder='Email', className="form-input"),
-            dcc.Input(id='pwd', type='password', placeholder='Mot de passe', className="form-input"),
-            dcc.Input(id='otp', type='text', placeholder='Code Google Auth', className="form-input"),
-            dcc.Checklist(id='remember-me', options=[{'label': 'Remember me', 'value': 'remember'}], value=[]),
-            html.Button('Connect', id='login-button', n_clicks=0, className="btn-primary"),
-        ], className="form-stack"), 
-        
-        html.Div(id='login-error', className="error-msg")
-    ], className="card login-card")
-], className="page-wrapper center-content")
-
-
-# Navigation bar, only visible if connected
-def navbar() -> html.Nav:
-    """
-    Create the navigation bar for the application.
-    
-    Generates a navigation bar with links to different sections of the app
-    that is only visible when a user is authenticated.
-    
-    Returns:
-        html.Nav: The navigation bar component
-    """
-    return html.Nav([
-        dcc.Link('Home', href='/home', className="nav-link"),
-        dcc.Link('Add', href='/edit', className="nav-link"),
-        dcc.Link('Search', href='/viz', className="nav-link"),
-        dcc.Link('Write', href='/writer', className="nav-link"),
-        html.A('Sign out', href='/logout', className="nav-link logout-btn")
-    ], className="navbar")
-
-app.layout = html.Div([
-    dcc.Location(id='url', refresh=True),
+    dcc.Location(id='url', refresh=False),
     html.Div(id='navbar-container'),
     html.Div(id='page-content', className="container")
 ])
@@ -173,12 +224,94 @@ def display_page(pathname: str):
     """
     if not current_user.is_authenticated:
         return login_layout, None
+
+    layout = _ROUTES.get(pathname, home_layout)
+    return (layout() if callable(layout) else layout), _NAVBAR
+
+
+# OTP bypass for local debugging, refreshed from the command line when run directly
+_DEBUG = bool(config.DEBUG)
+
+# TOTP instance, rebuilt only when the stored secret changes
+_totp: pyotp.TOTP | None = None
+
+def _get_totp() -> pyotp.TOTP:
+    """
+    Return the TOTP verifier for the configured Google Authenticator secret.
+    
+    The instance is kept between logins and only rebuilt when the secret
+    stored in the user configuration file changes.
+    
+    Returns:
+        pyotp.TOTP: The TOTP verifier for the user's secret
+    """
+    global _totp
+    secret = authenticator.get_otp_secret()
+    if _totp is None or _totp.secret != secret:
+        _totp = pyotp.TOTP(secret)
+    return _totp
+
+
+# Login brute-force protection, tracked per account; wrong passwords and OTP codes both count
+OTP_MAX_ATTEMPTS = 5
+OTP_ATTEMPT_WINDOW = 60  # seconds
+_otp_attempts: dict[str, tuple[int, float]] = {}
+_last_consumed_step: dict[str, int] = {}
+
+def _otp_rate_limited(email: str, now: float) -> bool:
+    """
+    Check whether an account exceeded the allowed number of login failures.
+    
+    Failures are counted within a rolling window starting at the first
+    failure; the counter is reset once the window has expired.
+    
+    Args:
+        email (str): Account being authenticated
+        now (float): Current timestamp
+        
+    Returns:
+        bool: True if the attempt must be rejected without verifying anything
+    """
+    count, first_ts = _otp_attempts.get(email, (0, now))
+    if now - first_ts > OTP_ATTEMPT_WINDOW:
+        _otp_attempts.pop(email, None)
+        return False
+    return count >= OTP_MAX_ATTEMPTS
+
+def _record_login_failure(email: str, now: float) -> None:
+    """
+    Count a failed login attempt against an account.
+    
+    Args:
+        email (str): Account being authenticated
+        now (float): Current timestamp
+    """
+    count, first_ts = _otp_attempts.get(email, (0, now))
+    _otp_attempts[email] = (count + 1, first_ts)
+
+def _verify_otp(email: str, otp: str, now: float) -> bool:
+    """
+    Verify a Google Authenticator code and consume its time step.
     
-    nav = navbar()
-    if pathname == '/edit': return editor.layout, nav
-    if pathname == '/viz': return viewer.layout, nav
-    if pathname == '/writer': return writer.layout, nav
-    return home_layout, nav 
+    A code is accepted only once: any step older than or equal to the last
+    successfully used one is rejected, which prevents replays within the
+    validity window. Failures are recorded for rate limiting.
+    
+    Args:
+        email (str): Account being authenticated
+        otp (str): Google Authenticator code
+        now (float): Current timestamp
+        
+    Returns:
+        bool: True if the code is valid and was not used before
+    """
+    step = int(now) // 30
+    if step > _last_consumed_step.get(email, -1) and _get_totp().verify(otp, for_time=now):
+        _last_consumed_step[email] = step
+        _otp_attempts.pop(email, None)
+        return True
+    _record_login_failure(email, now)
+    return False
 
 
 @app.callback(
@@ -187,9 +320,10 @@ def display_page(pathname: str):
     [State('email', 'value'),
      State('pwd', 'value'),
      State('otp', 'value'),
-     State('remember-me', 'remember')]
+     State('remember-me', 'value')],
+    prevent_initial_call=True
 )
-def auth_login(n_clicks, email: str, pwd: str, otp: str, remember_checked: bool):
+def auth_login(n_clicks, email: str, pwd: str, otp: str, remember_checked: list[str]):
     """
     Handle user authentication and login process.
     
@@ -201,46 +335,40 @@ def auth_login(n_clicks, email: str, pwd: str, otp: str, remember_checked: bool)
         email (str): User's email address
         pwd (str): User's password
         otp (str): Google Authenticator code
-        remember_checked (bool): Whether "remember me" option was selected
+        remember_checked (list[str]): Selected "remember me" options, empty if unchecked
         
     Returns:
         tuple: A tuple containing (redirect_url, error_message) for login handling
     """
     if n_clicks > 0:
-        user_email, user_pwd = authenticator.get_user()
-        if email == user_email and pwd == user_pwd:
+        now = time.time()
+        # There is a single account: failures count against it whatever email was typed,
+        # and are checked before the costly password hash verification.
+        # The debug bypass disables rate limiting, so it neither counts nor consumes attempts
+        account = authenticator.get_user()[0]
+        if not _DEBUG and _otp_rate_limited(account, now):
+            print("Trop de tentatives de connexion")
+            return dash.no_update, "Trop de tentatives, réessayez plus tard"
+        if authenticator.check_credentials(email, pwd):
             # Vérification du code Google Authenticator
-            totp = pyotp.TOTP(authenticator.get_otp_secret())
-            if totp.verify(otp) or config.DEBUG == True:
-                remember = False
-                if remember_checked:
-                    remember = True
+            if _DEBUG or _verify_otp(account, otp, now):
+                remember = bool(remember_checked)
                 print("auth successful")
                 login_user(User(email), remember=remember)
                 return '/', ''
             else:
                 print("Code OTP invalide")
                 return dash.no_update, "Code OTP invalide"
+        if not _DEBUG:
+            _record_login_failure(account, now)
         return dash.no_update, "Identifiants incorrects"
     return dash.no_update, ""
 
 
-@server.route('/logout')
-def logout() -> Response:
-    """
-    Handle user logout process.
-    
-    Logs out the current user and redirects them to the login page.
-    
-    Returns:
-        Response: Flask redirect response to login page
-    """
-    logout_user()
-    return flask.redirect('/login')
-
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Create user and generate Google Auth')
     parser.add_argument('-d', '--debug', help='generate a Google Auth for debug purpose', action="store_true")
     args = parser.parse_args()
     config.DEBUG = args.debug 
+    _DEBUG = bool(config.DEBUG)
     app.run(debug=config.DEBUG)
@@ -0,0 +1,18 @@
+import flask
+from flask_login import logout_user
+from werkzeug import Response
+
+auth_bp = flask.Blueprint('auth', __name__)
+
+@auth_bp.route('/logout')
+def logout() -> Response:
+    """
+    Handle user logout process.
+    
+    Logs out the current user and redirects them to the login page.
+    
+    Returns:
+        Response: Flask redirect response to login page
+    """
+    logout_user()
+    return flask.redirect('/login')
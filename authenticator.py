@@ -1,13 +1,67 @@
 import pyotp
 import json
+import os
+import hmac
+import mmap
 import argparse
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+
+try:
+    import orjson
+except ImportError:  # optional speed-up, stdlib json is used otherwise
+    orjson = None
+
+def _loads(data: bytes | memoryview) -> dict:
+    """Parse a JSON buffer with orjson when available."""
+    return orjson.loads(data) if orjson else json.loads(bytes(data))
+
+def _dumps(obj: dict) -> bytes:
+    """Serialize to indented JSON bytes with orjson when available."""
+    if orjson:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    # Same layout as orjson, which only supports two-space indentation
+    return json.dumps(obj, indent=2).encode()
+
+_password_hasher = PasswordHasher()
+
+# Parsed JSON files keyed by path, stored as (mtime_ns, content)
+_json_cache: dict[str, tuple[int, dict]] = {}
+
+def _cached_load(path: str) -> dict:
+    """
+    Load a JSON file, reusing the previous parse while the file is unchanged.
+    
+    The file is only re-read when its modification time differs from the
+    cached one, so repeated calls cost a single stat. Reloads parse the
+    memory-mapped file directly instead of copying it into a bytes object.
+    
+    Args:
+        path (str): Path of the JSON file to load
+        
+    Returns:
+        dict: Parsed content of the file
+    """
+    st = os.stat(path)
+    cached = _json_cache.get(path)
+    if cached is not None and cached[0] == st.st_mtime_ns:
+        return cached[1]
+    with open(path, "rb") as f:
+        if st.st_size == 0:
+            # mmap cannot map an empty file, let the parser report it
+            content = _loads(b"")
+        else:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+                content = _loads(view)
+    _json_cache[path] = (st.st_mtime_ns, content)
+    return content
 
 def generate_auth_link(email: str, mdp: str, debug: bool) -> None:
     """
     Generate authentication link and save user credentials.
     
-    Creates a Google Authenticator secret and saves user credentials to a JSON file.
-    Generates a provisioning URI for QR code generation.
+    Creates a Google Authenticator secret and saves user credentials to a JSON file,
+    the password being stored as an argon2id hash. Generates a provisioning URI for QR code generation.
     
     Args:
         email (str): User's email address
@@ -21,12 +75,11 @@ def generate_auth_link(email: str, mdp: str, debug: bool) -> None:
     
     user = {
     "email": email,
-    "pwd": mdp,
+    "pwd_hash": _password_hasher.hash(mdp),
     "otp_secret": otp_secret}
 
-    json_str = json.dumps(user, indent=4)
-    with open("data/users.json", "w") as f:
-        f.write(json_str)
+    with open("data/users.json", "wb") as f:
+        f.write(_dumps(user))
 
     totp = pyotp.TOTP(otp_secret)
     appname = 'IdeaManager'
@@ -44,22 +97,48 @@ def get_server_secret_key() -> str:
     Returns:
         str: The server's secret key
     """
-    with open("data/server.json", "r") as f:
-        user = json.load(f)
-    return user['secret_key']
+    return _cached_load("data/server.json")['secret_key']
 
 def get_user() -> tuple[str, str]:
     """
     Retrieve user credentials from configuration.
     
-    Reads user email and password from the user configuration file.
+    Reads user email and stored password from the user configuration file.
+    
+    Returns:
+        tuple[str, str]: A tuple containing (email, password hash), the plain
+            password being returned for files created before hashing was introduced
+    """
+    user = _cached_load("data/users.json")
+    return user['email'], user.get('pwd_hash', user.get('pwd'))
+
+def check_credentials(email: str, pwd: str) -> bool:
+    """
+    Check an email and password against the user configuration.
+    
+    The email is compared in constant time and the password verified against
+    its argon2 hash. Files still holding a plain password (created before
+    hashing was introduced) are compared in constant time as well; regenerate
+    them with this script to store a hash.
     
+    Args:
+        email (str): Email entered by the user
+        pwd (str): Password entered by the user
+        
     Returns:
-        tuple[str, str]: A tuple containing (email, password)
+        bool: True if both the email and the password match
     """
-    with open("data/users.json", "r") as f:
-        user = json.load(f)
-    return user['email'], user['pwd']
+    user = _cached_load("data/users.json")
+    email_ok = hmac.compare_digest((email or "").encode(), user['email'].encode())
+    if 'pwd_hash' in user:
+        try:
+            pwd_ok = _password_hasher.verify(user['pwd_hash'], pwd or "")
+        except (VerificationError, InvalidHashError):
+            # A corrupted or hand-edited hash rejects the login instead of raising
+            pwd_ok = False
+    else:
+        pwd_ok = hmac.compare_digest((pwd or "").encode(), user['pwd'].encode())
+    return email_ok & pwd_ok
 
 def get_otp_secret(): 
     """
@@ -70,9 +149,7 @@ def get_otp_secret():
     Returns:
         str: The user's Google Authenticator secret
     """
-    with open("data/users.json", "r") as f:
-        user = json.load(f)
-    return user['otp_secret']
+    return _cached_load("data/users.json")['otp_secret']
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Create user and generate Google Auth')
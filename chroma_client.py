@@ -1,7 +1,184 @@
 
+import os
+
+# CPUs this process may run on; thread pools must be sized before torch is imported
+NUM_THREADS = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+# These only reach thread pools started after this point: torch's below, and
+# numpy's BLAS only if numpy has not been imported yet by the entry point
+os.environ.setdefault("OMP_NUM_THREADS", str(NUM_THREADS))
+os.environ.setdefault("MKL_NUM_THREADS", str(NUM_THREADS))
+
+
+def _threads_from_env(name: str) -> int:
+    """
+    Read a thread count from an environment variable.
+    
+    Args:
+        name (str): Name of the environment variable
+        
+    Returns:
+        int: Its value, or NUM_THREADS if it is unset, empty or not a positive integer
+    """
+    try:
+        threads = int(os.environ.get(name, ""))
+    except ValueError:
+        return NUM_THREADS
+    return threads if threads > 0 else NUM_THREADS
+
+
 import chromadb
+from chromadb.api.types import Documents, Embeddings
 from chromadb.utils import embedding_functions
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Iterator
+import hashlib
+import sqlite3
+import threading
+import uuid
+import numpy as np
 import utils
+from config import EMBEDDING_BACKEND
+
+EMBEDDING_CACHE_SIZE = 8192
+# Documents per transformer forward pass
+ENCODE_BATCH_SIZE = 64
+# Text queries whose results are kept, and the cosine similarity above which a cached query is reused
+QUERY_CACHE_SIZE = 512
+QUERY_CACHE_SIMILARITY = 0.95
+
+try:
+    import torch
+    torch.set_num_threads(_threads_from_env("OMP_NUM_THREADS"))
+except ImportError:
+    torch = None
+
+
+def _to_records(names: list[str], documents: list[str], metadatas: list[dict | None]) -> list[dict[str, str]]:
+    """
+    Convert query results back into name/description records.
+    
+    The raw description is read from the metadata. Items stored before it was
+    kept there fall back to stripping the name prefix added by
+    utils.format_text from the document.
+    
+    Args:
+        names (list[str]): Ids of the returned documents
+        documents (list[str]): Stored documents, in the same order
+        metadatas (list[dict | None]): Stored metadata, in the same order
+        
+    Returns:
+        list[dict[str, str]]: List of dictionaries containing 'name' and 'description'
+    """
+    records = []
+    for name, doc, meta in zip(names, documents, metadatas):
+        description = meta.get("description") if meta else None
+        if description is None:
+            description = utils.unformat_text(name, doc)
+        records.append({'name': name, 'description': description})
+    return records
+
+
+class CachedEmbeddingFunction(embedding_functions.SentenceTransformerEmbeddingFunction):
+    """
+    SentenceTransformer embedding function with an in-memory LRU cache and an
+    optional on-disk cache.
+    
+    Embeddings are keyed on the exact document text, so re-inserting or
+    re-querying an unchanged item skips the transformer forward pass. The disk
+    cache keeps them across restarts.
+    """
+
+    def __init__(self, *args, cache_size: int = EMBEDDING_CACHE_SIZE, cache_path: str | None = None, **kwargs) -> None:
+        """
+        Initialize the embedding function and its caches.
+        
+        Args:
+            cache_size (int, optional): Maximum number of embeddings kept in memory.
+                Defaults to EMBEDDING_CACHE_SIZE.
+            cache_path (str | None, optional): SQLite file used as a persistent
+                cache. Defaults to None (memory only).
+            *args, **kwargs: Passed to SentenceTransformerEmbeddingFunction
+        """
+        super().__init__(*args, **kwargs)
+        # Backends, devices and dtypes give slightly different vectors: keep their disk entries apart
+        self._disk_variant = repr((self.model_name, self.device, self.normalize_embeddings, sorted(self.kwargs.items())))
+        self._cache: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._cache_size = cache_size
+        self._cache_lock = threading.Lock()
+        self._disk = None
+        if cache_path is not None:
+            self._disk = sqlite3.connect(cache_path, check_same_thread=False)
+            self._disk.execute("PRAGMA journal_mode=WAL")
+            self._disk.execute("CREATE TABLE IF NOT EXISTS emb (h BLOB PRIMARY KEY, v BLOB)")
+            self._disk.commit()
+
+    def _disk_key(self, text: str) -> bytes:
+        """
+        Hash a document together with the model and settings that embed it.
+        
+        Args:
+            text (str): Document text
+            
+        Returns:
+            bytes: SHA-256 digest used as the disk cache key
+        """
+        return hashlib.sha256(f"{self._disk_variant}\0{text}".encode()).digest()
+
+    def __call__(self, input: Documents) -> Embeddings:
+        """
+        Return embeddings for the documents, computing only the uncached ones.
+        
+        Args:
+            input (Documents): Documents to embed
+            
+        Returns:
+            Embeddings: One embedding per document, in input order
+        """
+        with self._cache_lock:
+            found = {text: self._cache[text] for text in input if text in self._cache}
+            for text in found:
+                self._cache.move_to_end(text)
+            missing = list(dict.fromkeys(text for text in input if text not in found))
+
+            if missing and self._disk is not None:
+                keys = {self._disk_key(text): text for text in missing}
+                key_list = list(keys)
+                # Stay under SQLite's default limit of 999 bound parameters
+                for start in range(0, len(key_list), 999):
+                    chunk = key_list[start:start + 999]
+                    placeholders = ", ".join(["?"] * len(chunk))
+                    for key, value in self._disk.execute(f"SELECT h, v FROM emb WHERE h IN ({placeholders})", chunk):
+                        found[keys[key]] = np.frombuffer(value, dtype=np.float32)
+                missing = [text for text in missing if text not in found]
+
+        computed = {}
+        if missing:
+            embeddings = self._model.encode(
+                missing,
+                batch_size=ENCODE_BATCH_SIZE,
+                convert_to_numpy=True,
+                normalize_embeddings=self.normalize_embeddings,
+                show_progress_bar=False
+            )
+            computed = dict(zip(missing, np.asarray(embeddings, dtype=np.float32)))
+            found.update(computed)
+
+        with self._cache_lock:
+            for text in input:
+                self._cache[text] = found[text]
+                self._cache.move_to_end(text)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+            if computed and self._disk is not None:
+                self._disk.executemany(
+                    "INSERT OR IGNORE INTO emb (h, v) VALUES (?, ?)",
+                    [(self._disk_key(text), np.asarray(embedding, dtype=np.float32).tobytes())
+                     for text, embedding in computed.items()]
+                )
+                self._disk.commit()
+        return [found[text] for text in input]
+
 
 class ChromaClient:
     """
@@ -12,6 +189,9 @@ class ChromaClient:
     and finding similar data items.
     """
 
+    # PersistentClient handles shared by every instance, keyed by absolute path
+    _clients: dict[str, chromadb.ClientAPI] = {}
+
     def __init__(self, db_path: str = "./data/embeddings", collection_name: str = "Ideas_topics") -> None:
         """
         Initialize the Embedder with a ChromaDB client and collection.
@@ -23,12 +203,155 @@ class ChromaClient:
                 Defaults to "Ideas_topics".
         """
         self.model_name = "all-distilroberta-v1"
-        self.client = chromadb.PersistentClient(path=db_path)
-        self.emb_fn = embedding_functions.SentenceTransformerEmbeddingFunction(model_name=self.model_name)
+        key = os.path.abspath(db_path)
+        if key not in ChromaClient._clients:
+            ChromaClient._clients[key] = chromadb.PersistentClient(path=db_path)
+        self.client = ChromaClient._clients[key]
+        if EMBEDDING_BACKEND != "torch":
+            backend = {"backend": EMBEDDING_BACKEND}
+        elif torch is not None and torch.cuda.is_available():
+            # Half precision on GPU; the encoder already batches documents by length
+            backend = {"device": "cuda", "model_kwargs": {"torch_dtype": "float16"}}
+        else:
+            backend = {}
+        self.emb_fn = CachedEmbeddingFunction(
+            model_name=self.model_name,
+            normalize_embeddings=True,
+            cache_path=os.path.join(db_path, "embedding_cache.sqlite3"),
+            **backend
+        )
+        # Cosine space, as used everywhere else; stated explicitly rather than
+        # relying on the embedding function's default. Existing collections keep theirs.
         self.collection = self.client.get_or_create_collection(
             name=collection_name,
-            embedding_function=self.emb_fn
+            embedding_function=self.emb_fn,
+            configuration={"hnsw": {"space": "cosine"}}
         )
+        # Semantic cache of text queries: one embedding per slot, with its results,
+        # requested size and last use, valid for a single collection version
+        self._query_lock = threading.Lock()
+        self._query_vectors: np.ndarray | None = None
+        self._query_results: list[list[dict[str, str]]] = []
+        self._query_n_results = np.zeros(QUERY_CACHE_SIZE, dtype=np.int64)
+        self._query_last_used = np.zeros(QUERY_CACHE_SIZE, dtype=np.int64)
+        self._query_clock = 0
+        self._query_version = ""
+        # Token rewritten on every change, shared by all processes using this database
+        self._version_path = os.path.join(db_path, "version")
+
+    def _collection_changed(self) -> None:
+        """
+        Forget every cached query result and publish a new collection version.
+        """
+        with self._query_lock:
+            self._query_results.clear()
+        tmp_path = f"{self._version_path}.{os.getpid()}.{threading.get_ident()}"
+        try:
+            with open(tmp_path, "w") as f:
+                f.write(uuid.uuid4().hex)
+            os.replace(tmp_path, self._version_path)
+        except OSError as e:
+            print(f"Error updating the collection version: {e}")
+
+    def version(self) -> str:
+        """
+        Return a token that changes whenever the collection is written.
+        
+        Lets callers cache results computed from the whole collection, such as
+        the TOC, across instances and processes.
+        
+        Returns:
+            str: Current version token, or an empty string if the collection
+                was never written through a ChromaClient
+        """
+        try:
+            with open(self._version_path) as f:
+                return f.read()
+        except OSError:
+            return ""
+
+    def _cached_query(self, query: np.ndarray, n_results: int, version: str) -> list[dict[str, str]] | None:
+        """
+        Look up the results of a query close enough to a cached one.
+        
+        Only entries cached for the same number of results are considered. The
+        whole cache is dropped when the collection version changed, including
+        writes made by other processes.
+        
+        Args:
+            query (np.ndarray): L2-normalized query embedding
+            n_results (int): Number of results requested
+            version (str): Current collection version, from version()
+            
+        Returns:
+            list[dict[str, str]] | None: Cached results, or None on a miss
+        """
+        with self._query_lock:
+            if version != self._query_version:
+                self._query_results.clear()
+                self._query_version = version
+            if not self._query_results:
+                return None
+            n = len(self._query_results)
+            scores = self._query_vectors[:n] @ query
+            scores[self._query_n_results[:n] != n_results] = -np.inf
+            best = int(np.argmax(scores))
+            if scores[best] < QUERY_CACHE_SIMILARITY:
+                return None
+            self._query_clock += 1
+            self._query_last_used[best] = self._query_clock
+            return [dict(record) for record in self._query_results[best]]
+
+    def _cache_query(self, query: np.ndarray, n_results: int, results: list[dict[str, str]], version: str) -> None:
+        """
+        Store the results of a query, evicting the least recently used one when full.
+        
+        Args:
+            query (np.ndarray): L2-normalized query embedding
+            n_results (int): Number of results requested
+            results (list[dict[str, str]]): Results of the query
+            version (str): Collection version read before running the query
+        """
+        with self._query_lock:
+            if version != self._query_version:
+                self._query_results.clear()
+                self._query_version = version
+            if self._query_vectors is None or self._query_vectors.shape[1] != len(query):
+                self._query_vectors = np.zeros((QUERY_CACHE_SIZE, len(query)), dtype=np.float32)
+                self._query_results.clear()
+            # Copied so the caller can modify the list it got back
+            results = [dict(record) for record in results]
+            if len(self._query_results) < QUERY_CACHE_SIZE:
+                slot = len(self._query_results)
+                self._query_results.append(results)
+            else:
+                slot = int(np.argmin(self._query_last_used))
+                self._query_results[slot] = results
+            self._query_vectors[slot] = query
+            self._query_n_results[slot] = n_results
+            self._query_clock += 1
+            self._query_last_used[slot] = self._query_clock
+
+    def _payload(self, items: list[tuple[str, str]]) -> dict:
+        """
+        Build the ids, documents, metadata and embeddings of a write.
+        
+        The embeddings are computed here in batched forward passes and passed
+        explicitly, so ChromaDB does not call the embedding function itself.
+        
+        Args:
+            items (list[tuple[str, str]]): (name, description) pairs to write
+            
+        Returns:
+            dict: Keyword arguments for collection.add, upsert or update
+        """
+        documents = [utils.format_text(name, description) for name, description in items]
+        return {
+            "ids": [name for name, _ in items],
+            "documents": documents,
+            "metadatas": [{"name": name, "description": description} for name, description in items],
+            "embeddings": np.asarray(self.emb_fn(documents), dtype=np.float32)
+        }
 
     def insert_data(self, name: str, description: str) -> None:
         """
@@ -41,11 +364,44 @@ class ChromaClient:
             name (str): The name/title of the data item to insert
             description (str): The description/content of the data item to insert
         """
-        self.collection.add(
-            documents=[utils.format_text(name, description)],
-            metadatas=[{"name": name}],
-            ids=[name]
-        )
+        self.insert_many([(name, description)])
+
+    def insert_many(self, items: list[tuple[str, str]]) -> None:
+        """
+        Insert several data items into the embedding database at once.
+        
+        All documents are sent in a single add call so that the embedding
+        function encodes them in batched forward passes.
+        
+        Args:
+            items (list[tuple[str, str]]): (name, description) pairs to insert
+        """
+        if not items:
+            return
+        self.collection.add(**self._payload(items))
+        self._collection_changed()
+
+    def upsert_data(self, name: str, description: str) -> None:
+        """
+        Insert or replace a data item in the embedding database.
+        
+        Args:
+            name (str): The name/title of the data item
+            description (str): The description/content of the data item
+        """
+        self.upsert_many([(name, description)])
+
+    def upsert_many(self, items: list[tuple[str, str]]) -> None:
+        """
+        Insert or replace several data items in a single call.
+        
+        Args:
+            items (list[tuple[str, str]]): (name, description) pairs to write
+        """
+        if not items:
+            return
+        self.collection.upsert(**self._payload(items))
+        self._collection_changed()
 
     def update_data(self, name: str, description: str) -> None:
         """
@@ -58,11 +414,22 @@ class ChromaClient:
             name (str): The name/title of the data item to update
             description (str): The new description/content for the data item
         """
-        self.collection.update(
-            documents=[utils.format_text(name, description)],
-            metadatas=[{"name": name}],
-            ids=[name]
-        )
+        self.update_many([(name, description)])
+
+    def update_many(self, items: list[tuple[str, str]]) -> None:
+        """
+        Update several existing data items at once.
+        
+        All documents are sent in a single update call so that the embedding
+        function encodes them in batched forward passes.
+        
+        Args:
+            items (list[tuple[str, str]]): (name, new description) pairs to update
+        """
+        if not items:
+            return
+        self.collection.update(**self._payload(items))
+        self._collection_changed()
         
     def remove_data(self, name: str) -> None:
         """
@@ -74,13 +441,15 @@ class ChromaClient:
             name (str): The name/title of the data item to remove
         """
         self.collection.delete(ids=[name])
+        self._collection_changed()
         
     def get_similar_data(self, name: str, description: str, n_results: int = 10) -> list[dict[str, str]]:
         """
         Find similar data items based on semantic similarity.
         
         Performs a semantic search in the ChromaDB collection to find
-        data items similar to the provided query.
+        data items similar to the provided query. Results of a recent query
+        with a near-identical embedding are reused without searching again.
         
         Args:
             name (str): The name/title of the query item
@@ -94,13 +463,49 @@ class ChromaClient:
         """
         if n_results == 0:
             return []
+        query = np.asarray(self.emb_fn([utils.format_text(name, description)])[0], dtype=np.float32)
+        # Read before querying: a concurrent write then invalidates what is cached below
+        version = self.version()
+        records = self._cached_query(query, n_results, version)
+        if records is not None:
+            return records
         results = self.collection.query(
-            query_texts=[utils.format_text(name, description)],
-            n_results=n_results
+            query_embeddings=query[np.newaxis],
+            n_results=n_results,
+            include=['metadatas', 'documents']
         )
-        names: list[str] = results["ids"][0]
-        descriptions: list[str] = results['documents'][0]
-        return [{'name': name, 'description': utils.unformat_text(name, desc)} for name, desc in zip(names, descriptions)]
+        records = _to_records(results["ids"][0], results['documents'][0], results['metadatas'][0])
+        self._cache_query(query, n_results, records, version)
+        return records
+
+    def get_similar_by_id(self, name: str, n_results: int = 10) -> list[dict[str, str]] | None:
+        """
+        Find data items similar to an item already stored in the collection.
+        
+        Reuses the stored embedding of the item as the query, so no new
+        embedding has to be computed.
+        
+        Args:
+            name (str): The name/id of the stored data item
+            n_results (int, optional): Number of similar results to return.
+                Defaults to 10.
+                
+        Returns:
+            list[dict[str, str]] | None: List of dictionaries containing 'name' and
+                'description' of similar data items, or None if the item is not
+                stored in the collection
+        """
+        stored = self.collection.get(ids=[name], include=['embeddings'])
+        if len(stored["ids"]) == 0:
+            return None
+        if n_results == 0:
+            return []
+        results = self.collection.query(
+            query_embeddings=stored["embeddings"],
+            n_results=n_results,
+            include=['metadatas', 'documents']
+        )
+        return _to_records(results["ids"][0], results['documents'][0], results['metadatas'][0])
 
     def get_all_data(self, max_items: int = 500) -> chromadb.GetResult:
         """
@@ -112,3 +517,40 @@ class ChromaClient:
             chromadb.GetResult: All data from the collection including embeddings and documents
         """
         return self.collection.get(include=['embeddings', 'documents'], limit=max_items)
+
+    def iter_all_data(self, page_size: int = 500) -> Iterator[chromadb.GetResult]:
+        """
+        Iterate over the embedding database one page at a time.
+        
+        Lets callers process large collections in bounded chunks instead of
+        materializing every embedding at once.
+        
+        Args:
+            page_size (int, optional): Number of items per page. Defaults to 500.
+            
+        Yields:
+            chromadb.GetResult: Documents, metadata and embeddings of the next page
+        """
+        offset = 0
+        while True:
+            page = self.collection.get(include=['embeddings', 'documents', 'metadatas'], limit=page_size, offset=offset)
+            if not page["ids"]:
+                return
+            yield page
+            if len(page["ids"]) < page_size:
+                return
+            offset += page_size
+
+
+@lru_cache(maxsize=1)
+def get_chroma_client() -> ChromaClient:
+    """
+    Return the process-wide ChromaClient for the default database.
+    
+    The client, its collection and the embedding model are created on first
+    use and shared by every later call.
+    
+    Returns:
+        ChromaClient: The shared client
+    """
+    return ChromaClient()
@@ -1,3 +1,5 @@
 # Database name
 NAME_DB = "data/knowledge.db"
-DEBUG = True
\ No newline at end of file
+DEBUG = True
+# SentenceTransformer backend: "torch", or "onnx" (needs optimum[onnxruntime])
+EMBEDDING_BACKEND = "torch"
@@ -1,11 +1,181 @@
 import sqlite3
+import fcntl
+import threading
 from typing import Any, Hashable
-import pandas as pd
-from chroma_client import ChromaClient
+from chroma_client import get_chroma_client
 from config import NAME_DB
 import argparse
-from concurrent.futures import ThreadPoolExecutor
+import atexit
+import queue
+import time
 
+EMBED_BATCH_SIZE = 32
+# Default SQLITE_MAX_VARIABLE_NUMBER on older SQLite builds
+SQLITE_MAX_PARAMS = 999
+
+EMBED_FLUSH_DELAY = 0.05
+
+# Embedding writes are applied in order by a single background worker
+_embedding_queue: queue.Queue = queue.Queue()
+_embedding_worker: threading.Thread | None = None
+_embedding_worker_lock = threading.Lock()
+
+def _apply_embeddings(batch: list[tuple[str, str, str | None]]) -> None:
+    """
+    Apply a batch of queued embedding writes to the ChromaClient.
+    
+    Consecutive upserts are sent in one upsert_many call; removals are applied
+    one by one, in queue order.
+    
+    Args:
+        batch (list[tuple[str, str, str | None]]): (action, name, description) items
+    """
+    client = get_chroma_client()
+    pending: dict[str, str] = {}
+
+    def flush() -> None:
+        if not pending:
+            return
+        try:
+            client.upsert_many(list(pending.items()))
+        except Exception:
+            # Retry one by one so a single bad item does not drop the batch
+            for name, description in pending.items():
+                try:
+                    client.upsert_data(name, description)
+                except Exception as e:
+                    print(f"Error writing embedding for '{name}': {e}")
+        pending.clear()
+
+    for action, name, description in batch:
+        if action == "upsert":
+            # A later write for the same name supersedes the pending one
+            pending.pop(name, None)
+            pending[name] = description
+            continue
+        flush()
+        try:
+            client.remove_data(name)
+        except Exception as e:
+            print(f"Error removing embedding for '{name}': {e}")
+    flush()
+
+def _embedding_loop() -> None:
+    """
+    Consume the embedding queue until the None sentinel is received.
+    
+    Items are grouped into batches of up to EMBED_BATCH_SIZE, waiting at most
+    EMBED_FLUSH_DELAY seconds after the first item of a batch.
+    """
+    running = True
+    while running:
+        item = _embedding_queue.get()
+        if item is None:
+            _embedding_queue.task_done()
+            break
+        batch = [item]
+        deadline = time.monotonic() + EMBED_FLUSH_DELAY
+        while len(batch) < EMBED_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = _embedding_queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                _embedding_queue.task_done()
+                running = False
+                break
+            batch.append(item)
+        try:
+            _apply_embeddings(batch)
+        except Exception as e:
+            # The batch is dropped, but the worker keeps serving later writes
+            print(f"Error applying {len(batch)} embedding writes: {e}")
+        finally:
+            for _ in batch:
+                _embedding_queue.task_done()
+
+def _stop_embedding_worker() -> None:
+    """
+    Apply the remaining queued embedding writes and stop the worker.
+    """
+    if _embedding_worker is not None and _embedding_worker.is_alive():
+        _embedding_queue.put(None)
+        _embedding_worker.join()
+
+atexit.register(_stop_embedding_worker)
+
+def _start_embedding_worker() -> None:
+    """
+    Start the background worker if it is not running yet, or no longer running.
+    """
+    global _embedding_worker
+    with _embedding_worker_lock:
+        if _embedding_worker is None or not _embedding_worker.is_alive():
+            _embedding_worker = threading.Thread(target=_embedding_loop, name="embedding", daemon=True)
+            _embedding_worker.start()
+
+def flush_embeddings() -> None:
+    """
+    Wait until every queued embedding write has been applied to ChromaDB.
+    
+    Call it at the end of a bulk run, or before reading back embeddings that
+    were just written.
+    """
+    if _embedding_queue.unfinished_tasks:
+        _start_embedding_worker()
+        _embedding_queue.join()
+
+def _queue_embedding(action: str, name: str, description: str | None = None) -> None:
+    """
+    Queue an embedding write for the background worker without waiting for it.
+    
+    Args:
+        action (str): "upsert" or "remove"
+        name (str): Name of the data item
+        description (str | None, optional): Description for "upsert"
+    """
+    _start_embedding_worker()
+    _embedding_queue.put((action, name, description))
+
+_local = threading.local()
+
+def _conn() -> sqlite3.Connection:
+    """
+    Return the SQLite connection of the current thread.
+    
+    The connection is opened on first use in each thread and reused by every
+    later query, so the schema and statement caches stay warm.
+    
+    Returns:
+        sqlite3.Connection: Connection to NAME_DB owned by the calling thread
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(NAME_DB, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA mmap_size=268435456")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-16384")
+        _local.conn = conn
+    return conn
+
+def _fetch_records(query: str, params: list | tuple = ()) -> list[dict[Hashable, Any]]:
+    """
+    Run a query and return its rows as dictionaries keyed by column name.
+    
+    Args:
+        query (str): SQL query to execute
+        params (list | tuple, optional): Parameters bound to the query
+        
+    Returns:
+        list[dict[Hashable, Any]]: One dictionary per row
+    """
+    cursor = _conn().execute(query, params)
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
 
 def init_database() -> None:
     """
@@ -16,12 +186,17 @@ def init_database() -> None:
     - data: stores data items with descriptions
     - relation: manages many-to-many relationships between data and tags
     
+    The database is switched to WAL journaling so readers are not blocked
+    while a write is in progress.
+    
     Returns:
         None
     """
-    conn = sqlite3.connect(NAME_DB)
+    conn = _conn()
     cursor = conn.cursor()
 
+    cursor.execute("PRAGMA journal_mode=WAL")
+
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS tags (name TEXT PRIMARY KEY);
     """)
@@ -40,8 +215,36 @@ def init_database() -> None:
     );
     """)
 
+    # The primary key already serves lookups by data_name
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_rel_tag ON relation(tag_name);
+    """)
+
     conn.commit()
-    conn.close()
+
+_db_initialized = False
+
+def ensure_database() -> None:
+    """
+    Initialize the database once per process.
+    
+    Subsequent calls return immediately. The initialization itself runs under
+    an exclusive file lock so that concurrent workers do not race on schema
+    creation.
+    
+    Returns:
+        None
+    """
+    global _db_initialized
+    if _db_initialized:
+        return
+    with open(NAME_DB + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            init_database()
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    _db_initialized = True
 
 # GET DATA OR TAGS
 def get_data_from_tags(tags: str, limit: int = 500) -> list[dict[Hashable, str]]:
@@ -62,18 +265,15 @@ def get_data_from_tags(tags: str, limit: int = 500) -> list[dict[Hashable, str]]
     else:
         tags_list = tags.split(";")
         placeholders = ", ".join(["?"] * len(tags_list))
-        conn = sqlite3.connect(NAME_DB)
         query = f"""
         SELECT DISTINCT d.name, d.description
         FROM data d
         JOIN relation r ON d.name = r.data_name
         JOIN tags t ON r.tag_name = t.name
         WHERE t.name IN ({placeholders})
-        LIMIT {limit};
+        LIMIT ?;
         """
-        df = pd.read_sql_query(query, conn, params=tags_list)
-        conn.close()
-    return df.to_dict("records")
+        return _fetch_records(query, tags_list + [limit])
 
 def get_data(limit: int = 500) -> list[dict[Hashable, Any]]:
     """
@@ -87,12 +287,10 @@ def get_data(limit: int = 500) -> list[dict[Hashable, Any]]:
     Returns:
         list[dict[Hashable, Any]]: List of dictionaries containing all data items
     """
-    conn = sqlite3.connect(NAME_DB)
-    query = f"SELECT * FROM data LIMIT {limit}"
-    df = pd.read_sql_query(query, conn)
-    df['id'] = df['name']
-    conn.close()
-    return df.to_dict("records")
+    records = _fetch_records("SELECT * FROM data LIMIT ?", (limit,))
+    for record in records:
+        record['id'] = record['name']
+    return records
 
 def get_selected_data(subname: str) -> list[dict[Hashable, Any]]:
     """
@@ -107,11 +305,10 @@ def get_selected_data(subname: str) -> list[dict[Hashable, Any]]:
         list[dict[Hashable, Any]]: List of dictionaries containing matching data items
     """
     subname = "%" + subname + "%"
-    conn = sqlite3.connect(NAME_DB)
-    df = pd.read_sql_query("SELECT * FROM data WHERE name LIKE (?)", conn, params=[subname])
-    df['id'] = df['name']
-    conn.close()
-    return df.to_dict("records")
+    records = _fetch_records("SELECT * FROM data WHERE name LIKE (?)", [subname])
+    for record in records:
+        record['id'] = record['name']
+    return records
 
 def get_description(data_name: str) -> str:
     """
@@ -123,12 +320,10 @@ def get_description(data_name: str) -> str:
         data_name (str): Name of the data item to retrieve description for
         
     Returns:
-        str: Description of the data item
+        str: Description of the data item, or an empty string if it does not exist
     """
-    conn = sqlite3.connect(NAME_DB)
-    df = pd.read_sql_query("SELECT description FROM data WHERE name=(?)", conn, params=[data_name])
-    conn.close()
-    return df['description'].iloc[0]
+    row = _conn().execute("SELECT description FROM data WHERE name=(?)", (data_name,)).fetchone()
+    return row[0] if row and row[0] is not None else ""
 
 def get_tags() -> list[dict[Hashable, Any]]:
     """
@@ -139,10 +334,7 @@ def get_tags() -> list[dict[Hashable, Any]]:
     Returns:
         list[dict[Hashable, Any]]: List of dictionaries containing all tags
     """
-    conn = sqlite3.connect(NAME_DB)
-    df = pd.read_sql_query("SELECT * FROM tags", conn)
-    conn.close()
-    return df.to_dict("records")
+    return _fetch_records("SELECT * FROM tags")
 
 def get_tags_from_data(data: str):
     """
@@ -159,31 +351,58 @@ def get_tags_from_data(data: str):
     if not data:
         return get_tags()
     else:
-        conn = sqlite3.connect(NAME_DB)
         query = "SELECT tag_name FROM relation WHERE data_name = (?)"
-        df = pd.read_sql_query(query, conn, params=[data])
-        conn.close()
-    return df['tag_name'].to_list()
+        return [row[0] for row in _conn().execute(query, (data,))]
 
-def get_similar_data(data: str) -> None:
+def get_tags_from_data_many(names: list[str]) -> dict[str, list[str]]:
+    """
+    Retrieve the tags of several data items with one query per chunk.
+    
+    Args:
+        names (list[str]): Names of the data items to retrieve tags for
+        
+    Returns:
+        dict[str, list[str]]: Tag names keyed by data item name; items without
+            tags map to an empty list
+    """
+    tags: dict[str, list[str]] = {name: [] for name in names}
+    unique_names = list(tags)
+    conn = _conn()
+    for start in range(0, len(unique_names), SQLITE_MAX_PARAMS):
+        chunk = unique_names[start:start + SQLITE_MAX_PARAMS]
+        placeholders = ", ".join(["?"] * len(chunk))
+        query = f"SELECT data_name, tag_name FROM relation WHERE data_name IN ({placeholders})"
+        for data_name, tag_name in conn.execute(query, chunk):
+            tags[data_name].append(tag_name)
+    return tags
+
+def get_similar_data(data: str) -> list[dict[str, str]]:
     """
     Find similar data items based on semantic similarity.
     
     Uses the ChromaClient to find data items similar to the specified data item.
+    The stored embedding of the item is used as the query; the description is
+    only read from the database when the item has no embedding yet.
     
     Args:
         data (str): Name of the data item to find similar items for
         
     Returns:
-        None: Results are returned through the ChromaClient's get_similar_data method
-    """
-    conn = sqlite3.connect(NAME_DB)
+        list[dict[str, str]]: 'name' and 'description' of the similar items, or an
+            empty list if the data item does not exist
+    """
+    client = get_chroma_client()
+    # The item may have been written a moment ago and still be queued
+    flush_embeddings()
+    results = client.get_similar_by_id(data)
+    if results is not None:
+        return results
     query = "SELECT name, description FROM data WHERE name = (?)"
-    df = pd.read_sql_query(query, conn, params=[data])
-    chroma = ChromaClient()
-    results = chroma.get_similar_data(df['name'], df['description'])
-    conn.close()
-    return results
+    row = _conn().execute(query, (data,)).fetchone()
+    if row is None:
+        return []
+    name, description = row
+    return client.get_similar_data(name, description or "")
 
 # ADD FUNCTIONS
 def add_data(name: str, description: str) -> None:
@@ -200,28 +419,25 @@ def add_data(name: str, description: str) -> None:
     Returns:
         None
     """
-    conn = sqlite3.connect(NAME_DB)
+    conn = _conn()
     cursor = conn.cursor()
     try:
         cursor.execute(
-            "INSERT INTO data (name, description) VALUES (?, ?)",
+            "INSERT INTO data (name, description) VALUES (?, ?) ON CONFLICT(name) DO NOTHING",
             (name, description)
         )
         conn.commit()
+        if cursor.rowcount == 0:
+            print(f"Errr : data '{name}' already exists.")
+            return
         
-        # Run embedding insertion asynchronously using thread pool
-        with ThreadPoolExecutor() as executor:
-            future = executor.submit(lambda: ChromaClient().insert_data(name, description))
-            # Wait for completion but don't block the main thread significantly
-            future.result(timeout=30)  # 30 second timeout
-            
+        _queue_embedding("upsert", name, description)
         print(f"data '{name}'  added successfully.")
-    except sqlite3.IntegrityError:
-        print(f"Errr : data '{name}' already exists.")
-    except Exception as e:
-        print(f"Error adding embedding for '{name}': {e}")
+    except sqlite3.Error as e:
+        print(f"Error adding data : {e}")
     finally:
-        conn.close()
+        if conn.in_transaction:
+            conn.rollback()
 
 def add_tag(name: str) -> None:
     """
@@ -235,7 +451,7 @@ def add_tag(name: str) -> None:
     Returns:
         None
     """
-    conn = sqlite3.connect(NAME_DB)
+    conn = _conn()
     cursor = conn.cursor()
     try:
         cursor.execute(
@@ -247,7 +463,8 @@ def add_tag(name: str) -> None:
     except sqlite3.IntegrityError:
         print(f"Error : tag '{name}' already exists.")
     finally:
-        conn.close()
+        if conn.in_transaction:
+            conn.rollback()
 
 def add_relation(data_name: str, tag_name: str) -> None:
     """
@@ -262,7 +479,7 @@ def add_relation(data_name: str, tag_name: str) -> None:
     Returns:
         None
     """
-    conn = sqlite3.connect(NAME_DB)
+    conn = _conn()
     cursor = conn.cursor()
     try:
         cursor.execute(
@@ -274,7 +491,66 @@ def add_relation(data_name: str, tag_name: str) -> None:
     except sqlite3.IntegrityError:
         print(f"Error : This relation already exists or foreign keys are unvalid.")
     finally:
-        conn.close()
+        if conn.in_transaction:
+            conn.rollback()
+
+def add_data_many(rows: list[tuple[str, str]]) -> None:
+    """
+    Add several data items to the database in a single transaction.
+    
+    Items whose name already exists are skipped, as in add_data. The embeddings
+    of the inserted items are queued for the background worker, which writes
+    them in batches.
+    
+    Args:
+        rows (list[tuple[str, str]]): (name, description) pairs to add
+        
+    Returns:
+        None
+    """
+    conn = _conn()
+    new_rows = []
+    try:
+        with conn:
+            for name, description in rows:
+                cursor = conn.execute(
+                    "INSERT INTO data (name, description) VALUES (?, ?) ON CONFLICT(name) DO NOTHING",
+                    (name, description)
+                )
+                # Like add_data, the first occurrence of a name wins
+                if cursor.rowcount:
+                    new_rows.append((name, description))
+    except sqlite3.Error as e:
+        print(f"Error adding data : {e}")
+        return
+    print(f"{len(new_rows)} data added successfully, {len(rows) - len(new_rows)} skipped.")
+
+    for name, description in new_rows:
+        _queue_embedding("upsert", name, description)
+
+def add_relation_many(relations: list[tuple[str, str]]) -> None:
+    """
+    Create several relationships between data items and tags at once.
+    
+    Relations that already exist are ignored.
+    
+    Args:
+        relations (list[tuple[str, str]]): (data_name, tag_name) pairs to link
+        
+    Returns:
+        None
+    """
+    conn = _conn()
+    try:
+        before = conn.total_changes
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO relation (data_name, tag_name) VALUES (?, ?)",
+                relations
+            )
+        print(f"{conn.total_changes - before} relations added successfully.")
+    except sqlite3.Error as e:
+        print(f"Error adding relations : {e}")
 
 # REMOVE FUNCTIONS
 def remove_data(name: str) -> None:
@@ -290,7 +566,7 @@ def remove_data(name: str) -> None:
     Returns:
         None
     """
-    conn = sqlite3.connect(NAME_DB)
+    conn = _conn()
     cursor = conn.cursor()
     try:
         cursor.execute(
@@ -298,13 +574,13 @@ def remove_data(name: str) -> None:
             (name,)
         )
         conn.commit()
-        embedding = ChromaClient()
-        embedding.remove_data(name)
+        _queue_embedding("remove", name)
         print(f"data '{name}' removed successfully.")
     except sqlite3.Error as e:
         print(f"Error deleting data : {e}")
     finally:
-        conn.close()
+        if conn.in_transaction:
+            conn.rollback()
 
 def remove_tag(name: str) -> None:
     """
@@ -318,7 +594,7 @@ def remove_tag(name: str) -> None:
     Returns:
         None
     """
-    conn = sqlite3.connect(NAME_DB)
+    conn = _conn()
     cursor = conn.cursor()
     try:
         cursor.execute(
@@ -330,7 +606,8 @@ def remove_tag(name: str) -> None:
     except sqlite3.Error as e:
         print(f"Error deleting tag : {e}")
     finally:
-        conn.close()
+        if conn.in_transaction:
+            conn.rollback()
 
 def remove_relation(data_name: str, tag_name: str) -> None:
     """
@@ -345,7 +622,7 @@ def remove_relation(data_name: str, tag_name: str) -> None:
     Returns:
         None
     """
-    conn = sqlite3.connect(NAME_DB)
+    conn = _conn()
     cursor = conn.cursor()
     try:
         cursor.execute(
@@ -358,7 +635,8 @@ def remove_relation(data_name: str, tag_name: str) -> None:
     except sqlite3.Error as e:
         print(f"Error when deleting relation : {e}")
     finally:
-        conn.close()
+        if conn.in_transaction:
+            conn.rollback()
 
 def update_data(name: str, description: str) -> None:
     """
@@ -374,7 +652,7 @@ def update_data(name: str, description: str) -> None:
     Returns:
         None
     """
-    conn = sqlite3.connect(NAME_DB)
+    conn = _conn()
     cursor = conn.cursor()
     try:
         cursor.execute(
@@ -382,27 +660,24 @@ def update_data(name: str, description: str) -> None:
             (description, name)
         )
         conn.commit()
+        if cursor.rowcount == 0:
+            print(f"Error : data '{name}' can't be updated.")
+            return
         
-        # Run embedding update asynchronously using thread pool
-        with ThreadPoolExecutor() as executor:
-            future = executor.submit(lambda: ChromaClient().update_data(name, description))
-            # Wait for completion but don't block the main thread significantly
-            future.result(timeout=30)  # 30 second timeout
-            
+        _queue_embedding("upsert", name, description)
         print(f"data '{name}'  updated successfully.")
-    except sqlite3.IntegrityError:
-        print(f"Error : data '{name}' can't be updated.")
-    except Exception as e:
-        print(f"Error updating embedding for '{name}': {e}")
+    except sqlite3.Error as e:
+        print(f"Error : data '{name}' can't be updated: {e}")
     finally:
-        conn.close()
+        if conn.in_transaction:
+            conn.rollback()
 
 def embed_all_data() -> None:
     """
     Regenerate embeddings for all data items in the database.
     
-    Retrieves all data items from the database and creates embeddings
-    for each one using the ChromaClient.
+    Retrieves all data items from the database and creates their embeddings
+    in batches of similar description length using the ChromaClient.
     
     Returns:
         None
@@ -411,20 +686,22 @@ def embed_all_data() -> None:
         # Use the existing get_data() function to retrieve all data
         data_items = get_data()
         
-        # Create Embedder instance
-        embedding = ChromaClient()
-        
-        # Process all data items
         total_items = len(data_items)
         print(f"Regenerating embeddings for {total_items} data items...")
         
-        for i, item in enumerate(data_items, 1):
+        # Sort by length so each batch pads to a similar sequence length
+        items = sorted(
+            ((item['name'], item['description']) for item in data_items),
+            key=lambda item: len(item[1] or "")
+        )
+        embedding = get_chroma_client()
+        for start in range(0, total_items, EMBED_BATCH_SIZE):
+            batch = items[start:start + EMBED_BATCH_SIZE]
             try:
-                embedding.insert_data(item['name'], item['description'])
-                print(f"Processed {i}/{total_items}: {item['name']}")
+                embedding.upsert_many(batch)
+                print(f"Processed {start + len(batch)}/{total_items}")
             except Exception as e:
-                print(f"Error processing item '{item['name']}': {e}")
-                
+                print(f"Error processing batch starting at '{batch[0][0]}': {e}")
         print("Embedding regeneration completed successfully.")
         
     except Exception as e:
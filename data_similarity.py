@@ -1,25 +1,121 @@
+import copy
+import os
 import re
-import utils
 import numpy as np
-from typing import Any
-from chroma_client import ChromaClient
-import umap
-from sklearn.cluster import AgglomerativeClustering
-from sklearn.neighbors import LocalOutlierFactor
-from sklearn.preprocessing import MinMaxScaler
+from typing import Any, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from chroma_client import get_chroma_client
+import utils
+from scipy.cluster.hierarchy import fcluster, linkage
+from scipy.spatial.distance import squareform
+from scipy.sparse import csr_matrix
 from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.cluster import MiniBatchKMeans
+try:
+    import faiss
+except ImportError:  # optional speed-up for large collections, linkage is used otherwise
+    faiss = None
+try:
+    import fastcluster
+except ImportError:  # optional drop-in for scipy's linkage with a faster C++ core
+    fastcluster = None
+
+# Punctuation replaced by spaces before TF-IDF tokenization
+_PUNCT_RE = re.compile(r'[^\w\s]')
+# Same replacement for ASCII text as a str.translate table, which avoids the regex scan
+_PUNCT_TABLE = str.maketrans({chr(c): ' ' for c in range(128) if _PUNCT_RE.match(chr(c))})
+# Threads splitting the sections of a TOC level in parallel
+TOC_WORKERS = min(8, os.cpu_count() or 1)
+# Above this many distinct items, the first TOC level uses k-means instead of linkage
+KMEANS_MIN_ITEMS = 500
+# Items read from ChromaDB per request while loading a TOC
+TOC_PAGE_SIZE = 128
+# Sections whose ideas are on average at least this similar are not split further
+TIGHT_SECTION_SIMILARITY = 0.85
+# Best-scoring terms ranked first when picking a title; the rest is only sorted if they all overlap
+TITLE_CANDIDATES = 16
+# Nearest neighbours averaged by the originality score
+ORIGINALITY_NEIGHBORS = 20
+
+def _clean_text(doc: str) -> str:
+    """
+    Lowercase a document and replace its punctuation with spaces.
+    
+    Args:
+        doc (str): Document text
+        
+    Returns:
+        str: Cleaned text for TF-IDF tokenization
+    """
+    doc = doc.lower()
+    return doc.translate(_PUNCT_TABLE) if doc.isascii() else _PUNCT_RE.sub(' ', doc)
+
+def _percentages(scores: np.ndarray) -> np.ndarray:
+    """
+    Format scores in [0, 1] as truncated percentage strings, e.g. 0.427 -> "42%".
+    
+    Args:
+        scores (np.ndarray): Scores to format
+        
+    Returns:
+        np.ndarray: Object array of percentage strings
+    """
+    return np.array(np.char.add((scores * 100).astype(np.int64).astype(str), "%").tolist(), dtype=object)
+
+def _ranked_terms(scores: np.ndarray) -> Iterator[int]:
+    """
+    Yield term indices by decreasing score, sorting the whole vocabulary only if needed.
+    
+    Args:
+        scores (np.ndarray): Score of every term
+        
+    Yields:
+        int: Index of the next best term
+    """
+    if len(scores) <= TITLE_CANDIDATES:
+        yield from np.argsort(scores)[::-1]
+        return
+    top = np.argpartition(scores, -TITLE_CANDIDATES)[-TITLE_CANDIDATES:]
+    yield from top[np.argsort(scores[top])[::-1]]
+    ranked = np.argsort(scores)[::-1]
+    yield from ranked[~np.isin(ranked, top)]
+
+def _normalize(X: np.ndarray) -> np.ndarray:
+    """
+    Scale every row of a matrix to unit L2 norm.
+    
+    Args:
+        X (np.ndarray): Matrix with one embedding per row
+        
+    Returns:
+        np.ndarray: Row-normalized float32 copy of X
+    """
+    X = np.asarray(X, dtype=np.float32)
+    return X / (np.linalg.norm(X, axis=1, keepdims=True) + 1e-12)
 
 class DataSimilarity:
     """
     A class for ordering ideas.
     """
+
+    # Last TOC built for each max_items, with the collection version it was built from
+    _toc_cache: dict[int, tuple[str, list]] = {}
+
+    def __init__(self) -> None:
+        """
+        Initialize the TF-IDF state shared by all cluster titles of a TOC.
+        """
+        self._title_terms: np.ndarray | None = None
+        self._doc_terms = None
     
     def generate_toc_structure(self, max_items: int = 500) -> list:
         """
         Generate a hierarchical table of contents structure from all data.
         
         Creates a tree-like structure organizing all data items hierarchically
-        based on semantic similarities using clustering techniques.
+        based on semantic similarities using clustering techniques. The result
+        is reused until the collection is written again; each call returns its
+        own copy, so callers may modify it.
         
         Args:
             max_items (int): Maximum number of items to process to limit memory usage
@@ -27,115 +123,300 @@ class DataSimilarity:
         Returns:
             list: Hierarchical structure of data items
         """
-        # Stream data in chunks to limit memory usage
-        client = ChromaClient()
-        data = client.get_all_data(max_items)
-        originalities = self.generate_originality_score(data['embeddings'])
+        client = get_chroma_client()
+        # Read before loading: a write during the build then invalidates the result
+        version = client.version()
+        cached = DataSimilarity._toc_cache.get(max_items)
+        if cached is not None and cached[0] == version:
+            return copy.deepcopy(cached[1])
+
+        # Stream data in pages into one preallocated matrix to limit memory usage
+        documents: list[str] = []
+        descriptions: list[str] = []
+        ids: list[str] = []
+        Xn = None
+        for page in client.iter_all_data(page_size=max(1, min(TOC_PAGE_SIZE, max_items))):
+            n = min(len(page['ids']), max_items - len(ids))
+            if Xn is None:
+                Xn = np.empty((max_items, len(page['embeddings'][0])), dtype=np.float32)
+            # Chroma returns float64 arrays: cast straight into the float32 rows and normalize in place
+            rows = Xn[len(ids):len(ids) + n]
+            rows[...] = page['embeddings'][:n]
+            rows /= np.linalg.norm(rows, axis=1, keepdims=True) + 1e-12
+            documents.extend(page['documents'][:n])
+            # Raw descriptions are kept in the metadata; older items only have the document
+            for name, doc, meta in zip(page['ids'][:n], page['documents'][:n], page['metadatas'][:n]):
+                description = meta.get("description") if meta else None
+                descriptions.append(utils.unformat_text(name, doc) if description is None else description)
+            ids.extend(page['ids'][:n])
+            del page
+            if len(ids) >= max_items:
+                break
+        if not ids:
+            return []
+        Xn = Xn[:len(ids)]
+        # Originality and the cosine distances of every level share this single matrix product
+        S = self.similarity_matrix(Xn)
+        originalities = self.generate_originality_score(Xn, S)
+        D = 1.0 - S
+        # Rounding can push distances slightly outside [0, 2]; clip them once for all levels
+        np.clip(D, 0.0, 2.0, out=D)
+        self._fit_title_vectorizer(documents)
         
-        toc = self._generate_toc_structure(data['documents'], data['ids'], data['embeddings'], originalities)
+        toc = self._generate_toc_structure(
+            np.array(documents, dtype=object),
+            np.array(ids, dtype=object),
+            np.array(descriptions, dtype=object),
+            Xn,
+            D,
+            originalities
+        )
 
+        DataSimilarity._toc_cache[max_items] = (version, copy.deepcopy(toc))
         return toc
 
-    def generate_originality_score(self, embeddings) -> list[float]:
+    def similarity_matrix(self, embeddings) -> np.ndarray:
         """
-        Generate originality scores for documents using UMAP dimensionality reduction
-        and Local Outlier Factor analysis.
+        Compute the pairwise cosine similarity of a set of embeddings.
         
-        This method reduces the dimensionality of embeddings using UMAP and then
-        applies Local Outlier Factor to identify outliers (unique/creative documents)
-        which are considered more original.
+        Rows are normalized once and the similarities come from a single
+        matrix product, rather than sklearn's cosine_similarity which
+        re-normalizes and dispatches through safe_sparse_dot on every call.
         
         Args:
-            embeddings: List of document embeddings to analyze
+            embeddings: Matrix or list of document embeddings
             
         Returns:
-            list[float]: Normalized originality scores for each document (higher = more original)
+            np.ndarray: Square float32 matrix of cosine similarities
         """
-        X = np.array(embeddings)
+        Xn = _normalize(embeddings)
+        return Xn @ Xn.T
 
-        reducer = umap.UMAP(
-            n_neighbors=15,      # Controls local vs. global structure
-            n_components=10,     # Target dimensions for clustering
-            metric='cosine',     # Use cosine for RoBERTa embeddings
-            low_memory=True      # Helps with very large datasets
-        )
-
-        reduced_X = reducer.fit_transform(X)
+    def generate_originality_score(self, embeddings, similarities: np.ndarray | None = None) -> np.ndarray:
+        """
+        Generate originality scores for documents from their nearest neighbours.
+        
+        The score of a document is its mean cosine distance to its
+        ORIGINALITY_NEIGHBORS most similar documents, min-max scaled: ideas far
+        from all others are considered more original. All neighbours come from
+        a single similarity matrix product.
+        
+        Args:
+            embeddings: List of document embeddings to analyze
+            similarities (np.ndarray | None, optional): Precomputed cosine similarity
+                matrix of the embeddings. Defaults to None (computed here).
+            
+        Returns:
+            np.ndarray: Normalized originality scores for each document (higher = more original)
+        """
+        if similarities is None:
+            similarities = self.similarity_matrix(embeddings)
+        n = len(similarities)
+        if n < 2:
+            return np.zeros(n, dtype=np.float32)
 
-        lof = LocalOutlierFactor(n_neighbors=20)
-        lof.fit_predict(reduced_X)
-        score_density = -lof.negative_outlier_factor_
-        return MinMaxScaler().fit_transform(score_density.reshape(-1, 1)).flatten()
+        k = min(ORIGINALITY_NEIGHBORS, n - 1)
+        # One negated copy, partitioned in place: its first k columns are the k nearest
+        neg = np.negative(similarities, dtype=np.float32)
+        np.fill_diagonal(neg, np.inf)
+        neg.partition(k - 1, axis=1)
+        score_density = 1.0 + neg[:, :k].mean(axis=1)
+        spread = np.ptp(score_density)
+        if spread == 0:
+            return np.zeros(n, dtype=np.float32)
+        return (score_density - score_density.min()) / spread
 
 
-    def _generate_toc_structure(self, docs: list[str], ids: list[str], embeddings, originalities: list[float], level: int = 1, max_depth: int = 3) -> list[dict[str, Any]] | list[Any]:
+    def _generate_toc_structure(self, docs: np.ndarray, ids: np.ndarray, descriptions: np.ndarray, X: np.ndarray, D: np.ndarray, originalities: np.ndarray, max_depth: int = 3) -> list[dict[str, Any]] | list[Any]:
         """
-        Recursively generate a hierarchical table of contents structure.
+        Generate a hierarchical table of contents structure.
         
-        This private method creates a hierarchical organization of data items
-        by applying clustering at different levels based on semantic similarities.
+        The tree is built breadth-first from a worklist: every section of a
+        level is split before the next level starts, so the titles of a whole
+        level come from one batched TF-IDF product. Sections only carry the
+        indices of their documents in the full arrays.
         
         Args:
-            docs (list[str]): List of document texts
-            ids (list[str]): List of document IDs
-            embeddings: List of document embeddings
-            originalities (list[float]): Originality scores for each document
-            level (int, optional): Current hierarchy level. Defaults to 1.
-            max_depth (int, optional): Maximum recursion depth. Defaults to 3.
+            docs (np.ndarray): Object array of document texts
+            ids (np.ndarray): Object array of document IDs
+            descriptions (np.ndarray): Object array of the raw descriptions
+            X (np.ndarray): Matrix of L2-normalized document embeddings, one row per document
+            D (np.ndarray): Pairwise cosine distances between the documents
+            originalities (np.ndarray): Originality scores for each document
+            max_depth (int, optional): Maximum depth of the hierarchy. Defaults to 3.
             
         Returns:
-            list[dict[str, Any]] | list[Any]: Hierarchical structure at current level
+            list[dict[str, Any]] | list[Any]: Hierarchical structure of the TOC
         """
-        X = np.array(embeddings)
+        toc: list[dict[str, Any]] = []
+        # Formatted once for every idea instead of at each leaf
+        percentages = _percentages(originalities)
+        # (document indices, level, list receiving the entries of the section)
+        layer = [(np.arange(len(X)), 1, toc)]
 
-        if len(X) <= 2 or level > max_depth:
-            entries = [{"title": id, "text": doc, "type": "idea", "id": id, "originality": str(int(originality * 100)) + "%"} for doc, id, originality in zip(docs, ids, originalities)]
-            return entries
+        # Sections of a level are independent; numpy and scipy release the GIL
+        with ThreadPoolExecutor(max_workers=TOC_WORKERS) as executor:
+            while layer:
+                splits = executor.map(lambda item: self._split_section(X, D, item[0], item[1], max_depth), layer)
+                next_layer = []
+                headings = []
+                for (indices, level, entries), clusters in zip(layer, splits):
+                    if clusters is None:
+                        entries.extend({"title": id, "text": doc, "description": description, "type": "idea", "id": id, "originality": percentage} for doc, id, description, percentage in zip(docs[indices], ids[indices], descriptions[indices], percentages[indices]))
+                        continue
+                    for cluster in clusters:
+                        heading = {
+                            "title": None,
+                            "type": "heading",
+                            "level": level,
+                            "children": [],
+                            "originality": None
+                        }
+                        entries.append(heading)
+                        headings.append((cluster, heading))
+                        next_layer.append((cluster, level + 1, heading["children"]))
+                self._set_layer_originality(originalities, headings)
+                self._set_layer_titles(docs, headings)
+                layer = next_layer
 
-        n_clusters = max(2, int(np.sqrt(len(X))))
+        return toc
 
-        clustering = AgglomerativeClustering(
-            n_clusters=n_clusters,
-            metric='cosine',
-            linkage='average'
-        )
-        labels = clustering.fit_predict(X)
+    def _split_section(self, X: np.ndarray, D: np.ndarray, indices: np.ndarray, level: int, max_depth: int) -> list[np.ndarray] | None:
+        """
+        Cluster the documents of one TOC section into sub-sections.
+        
+        Args:
+            X (np.ndarray): Matrix of L2-normalized document embeddings
+            D (np.ndarray): Pairwise cosine distances between the documents
+            indices (np.ndarray): Indices of the section documents in X and D
+            level (int): Level of the section in the hierarchy
+            max_depth (int): Maximum depth of the hierarchy
+            
+        Returns:
+            list[np.ndarray] | None: Document indices of each sub-section, or
+                None when the section only holds ideas
+        """
+        if len(indices) <= 2 or level > max_depth:
+            return None
 
-        toc = []
-        for label in np.unique(labels):
-            indices = np.where(labels == label)[0]
+        # Mean pairwise cosine of unit vectors from their sum, without the m² matrix
+        m = len(indices)
+        total = X[indices].sum(axis=0)
+        if (total @ total - m) / (m * (m - 1)) >= TIGHT_SECTION_SIMILARITY:
+            return None
 
-            cluster_embeddings = [embeddings[i] for i in indices]
-            cluster_docs = [docs[i] for i in indices]
-            cluster_ids = [ids[i] for i in indices]
-            cluster_originalities = [originalities[i] for i in indices]
+        # Cluster each distinct embedding once; duplicates follow their first copy
+        Xq = np.ascontiguousarray(np.round(X[indices] * 1e4).astype(np.int32))
+        keys = Xq.view(np.dtype((np.void, Xq.dtype.itemsize * Xq.shape[1]))).ravel()
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        if len(first) < 2:
+            # Only copies of the same idea: nothing left to split
+            return None
+        # Keep the distinct items in their original order
+        order = np.argsort(first)
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        unique_indices = indices[first[order]]
 
-            # Compute average originality score for the cluster
-            avg_cluster_originality = np.mean(cluster_originalities) if cluster_originalities else 0
+        n_clusters = max(2, int(np.sqrt(len(indices))))
 
-            title_text = self.generate_synthetic_title(cluster_docs)
+        if level == 1 and len(unique_indices) > KMEANS_MIN_ITEMS:
+            # Spherical k-means on unit vectors avoids the O(n²) linkage at the top level
+            X_unique = np.ascontiguousarray(X[unique_indices], dtype=np.float32)
+            if faiss is not None:
+                kmeans = faiss.Kmeans(X_unique.shape[1], n_clusters, niter=20, spherical=True)
+                kmeans.train(X_unique)
+                _, unique_labels = kmeans.index.search(X_unique, 1)
+                unique_labels = unique_labels.ravel()
+            else:
+                # On unit vectors, euclidean k-means ranks points like cosine k-means
+                kmeans = MiniBatchKMeans(n_clusters=n_clusters, n_init=3, batch_size=256, max_iter=50, random_state=0)
+                unique_labels = kmeans.fit_predict(X_unique)
+        else:
+            # Average linkage on the condensed cosine distances of the distinct items
+            condensed = squareform(D[np.ix_(unique_indices, unique_indices)], checks=False)
+            Z = (fastcluster.linkage if fastcluster is not None else linkage)(condensed, method='average')
+            unique_labels = fcluster(Z, t=min(n_clusters, len(unique_indices)), criterion='maxclust') - 1
+        labels = unique_labels[rank[inverse.ravel()]]
 
-            children = self._generate_toc_structure(
-                cluster_docs,
-                cluster_ids,
-                cluster_embeddings,
-                cluster_originalities,
-                level + 1,
-                max_depth
-            )
+        # Group members by label with one stable sort instead of a scan per label
+        by_label = np.argsort(labels, kind='stable')
+        boundaries = np.flatnonzero(np.diff(labels[by_label])) + 1
+        return [indices[members] for members in np.split(by_label, boundaries)]
+
+    def _set_layer_originality(self, originalities: np.ndarray, headings: list[tuple[np.ndarray, dict[str, Any]]]) -> None:
+        """
+        Set the average originality of every heading of a TOC level at once.
+        
+        The members of all headings are gathered into one array and averaged
+        with a single segmented sum.
+        
+        Args:
+            originalities (np.ndarray): Originality scores for each document
+            headings (list[tuple[np.ndarray, dict[str, Any]]]): Document indices
+                and entry of each heading of the level
+        """
+        if not headings:
+            return
+        sizes = np.array([len(indices) for indices, _ in headings])
+        starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+        members = np.concatenate([indices for indices, _ in headings])
+        means = np.add.reduceat(originalities[members], starts) / sizes
+        for (_, heading), percentage in zip(headings, _percentages(means)):
+            heading["originality"] = percentage
 
-            heading_entry = {
-                "title": title_text,
-                "type": "heading",
-                "level": level,
-                "children": children,
-                "originality": str(int(avg_cluster_originality * 100)) + "%"
-            }
-                        
-            toc.append(heading_entry)
+    def _set_layer_titles(self, docs: np.ndarray, headings: list[tuple[np.ndarray, dict[str, Any]]]) -> None:
+        """
+        Title every heading of a TOC level at once.
+        
+        A sparse membership matrix sums the precomputed TF-IDF rows of each
+        section in a single product.
+        
+        Args:
+            docs (np.ndarray): Object array of document texts
+            headings (list[tuple[np.ndarray, dict[str, Any]]]): Document indices
+                and entry of each heading of the level
+        """
+        if not headings:
+            return
+        if self._doc_terms is None:
+            for indices, heading in headings:
+                heading["title"] = self.generate_synthetic_title(docs[indices].tolist())
+            return
 
-        return toc
+        sizes = [len(indices) for indices, _ in headings]
+        membership = csr_matrix(
+            (np.ones(sum(sizes), dtype=np.float32), (np.repeat(np.arange(len(headings)), sizes), np.concatenate([indices for indices, _ in headings]))),
+            shape=(len(headings), self._doc_terms.shape[0])
+        )
+        layer_scores = (membership @ self._doc_terms).toarray()
+        for (indices, heading), scores in zip(headings, layer_scores):
+            heading["title"] = self._title_from_scores(scores, self._title_terms, docs[indices[0]])
     
+    def _fit_title_vectorizer(self, docs: list[str]) -> None:
+        """
+        Fit the TF-IDF vocabulary and IDF weights once on all documents.
+        
+        The TF-IDF row of every document is computed here as well, so cluster
+        titles only sum the rows of their members.
+        
+        Args:
+            docs (list[str]): All document texts of the TOC
+        """
+        vectorizer = TfidfVectorizer(
+            stop_words='english',
+            ngram_range=(1, 2),
+            max_features=2000
+        )
+        try:
+            self._doc_terms = vectorizer.fit_transform([_clean_text(doc) for doc in docs])
+        except ValueError:
+            # Empty vocabulary: titles fall back to a per-cluster fit
+            self._title_terms = None
+            self._doc_terms = None
+            return
+        self._title_terms = vectorizer.get_feature_names_out()
+
     def generate_synthetic_title(self, cluster_docs: list[str]) -> str:
         """
         Generate a synthetic title from a cluster of ideas using TF-IDF analysis.
@@ -153,7 +434,7 @@ class DataSimilarity:
         if not cluster_docs:
             return "New Section"
         
-        clean_docs = [re.sub(r'[^\w\s]', ' ', doc.lower()) for doc in cluster_docs]
+        clean_docs = [_clean_text(doc) for doc in cluster_docs]
 
         try:
             # On extrait un peu plus de termes pour avoir du choix après filtrage
@@ -162,41 +443,45 @@ class DataSimilarity:
                 ngram_range=(1, 2), 
                 max_features=30 
             )
-            
             tfidf_matrix = vectorizer.fit_transform(clean_docs)
             scores = np.asarray(tfidf_matrix.sum(axis=0)).flatten()
             terms = vectorizer.get_feature_names_out()
-            
-            # Tri des termes par score TF-IDF décroissant
-            sorted_indices = np.argsort(scores)[::-1]
-            sorted_terms = [terms[i] for i in sorted_indices]
-            
-            final_selection = []
-            
-            for term in sorted_terms:
-                # Sécurité : On limite à 2 ou 3 concepts clés pour le titre
-                if len(final_selection) >= 2:
-                    break
-                
-                # On vérifie si les mots du terme actuel sont déjà présents 
-                # dans les termes déjà sélectionnés (et inversement)
-                words_in_term = set(term.split())
-                is_redundant = False
-                
-                for selected in final_selection:
-                    words_in_selected = set(selected.split())
-                    # Si intersection non vide (ex: 'hardware' et 'hardware recommendation')
-                    if words_in_term.intersection(words_in_selected):
-                        is_redundant = True
-                        break
-                
-                if not is_redundant:
-                    final_selection.append(term)
-
-            # Mise en forme
-            title = " & ".join([t.capitalize() for t in final_selection])
-            
-            return title if len(title) > 2 else "Divers & " + cluster_docs[0][:20]
+            return self._title_from_scores(scores, terms, cluster_docs[0])
 
         except Exception:
             return "Section : " + cluster_docs[0][:30] + "..."
+
+    def _title_from_scores(self, scores: np.ndarray, terms: np.ndarray, first_doc: str) -> str:
+        """
+        Build a section title from the summed TF-IDF scores of its documents.
+        
+        Args:
+            scores (np.ndarray): Summed TF-IDF score of every term
+            terms (np.ndarray): Term of each score
+            first_doc (str): First document of the section, used when no term stands out
+            
+        Returns:
+            str: Title of the section
+        """
+        final_selection = []
+        selected_words: set[str] = set()
+        
+        # Termes par score TF-IDF décroissant
+        for i in _ranked_terms(scores):
+            # Sécurité : On limite à 2 ou 3 concepts clés pour le titre
+            # (les termes absents du cluster ont un score nul)
+            if len(final_selection) >= 2 or scores[i] <= 0:
+                break
+            
+            term = terms[i]
+            # On écarte le terme si un de ses mots est déjà dans la sélection
+            # (ex: 'hardware' et 'hardware recommendation')
+            words_in_term = term.split()
+            if selected_words.isdisjoint(words_in_term):
+                final_selection.append(term)
+                selected_words.update(words_in_term)
+
+        # Mise en forme
+        title = " & ".join([t.capitalize() for t in final_selection])
+        
+        return title if len(title) > 2 else "Divers & " + first_doc[:20]
@@ -1,9 +1,10 @@
 
 import sqlite3
 from typing import Any
+import numpy as np
 import pandas as pd
 import umap
-from data_similarity import Embedder
+from chroma_client import get_chroma_client
 from config import NAME_DB
 
 def get_network_recursive(start_node: str, max_depth: int=2) -> list[dict[str, Any]]:
@@ -78,16 +79,15 @@ def umap_all_data() -> pd.DataFrame:
     """
     Apply UMAP dimensionality reduction to all data embeddings.
 
-    This function retrieves all data from the Embedder, applies UMAP clustering
+    This function retrieves all data from the ChromaClient, applies UMAP clustering
     to reduce high-dimensional embeddings to 2D coordinates for visualization,
     and returns a DataFrame with the projected coordinates.
 
     Returns:
         pd.DataFrame: DataFrame containing columns 'x', 'y' for coordinates and 'text' for labels
     """
-    embedding = Embedder()
-    data = embedding.get_all_data()
-    vectors = data['embeddings']
+    data = get_chroma_client().get_all_data()
+    vectors = np.asarray(data['embeddings'], dtype=np.float32)
     documents = data['documents']
     name = data['ids']
 
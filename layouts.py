@@ -0,0 +1,61 @@
+from dash import html, dcc
+
+home_layout = html.Div([
+    html.Div([
+        html.H1("Idea manager"),
+        html.P("Welcome to the main interface", className="subtitle"),
+        html.Div([
+            html.Div([
+                html.H3("Edition"),
+                html.P("Access to Edition to add new ideas/notes."),
+                dcc.Link("Add note", href="/edit", className="btn-secondary")
+            ], className="card"),
+            html.Div([
+                html.H3("Viewer"),
+                html.P("Visualize database and navigate into ideas."),
+                dcc.Link("Navigate", href="/viz", className="btn-secondary")
+            ], className="card"),
+            html.Div([
+                html.H3("Writer"),
+                html.P("Write a white paper based on ideas."),
+                dcc.Link("Write", href="/writer", className="btn-secondary")
+            ], className="card"),
+        ], className="grid-2")
+    ], className="content-container")
+])
+
+login_layout = html.Div([
+    html.Div([
+        html.H2("Secured Access"),
+        html.P("Identify yourself to access", className="subtitle"),
+        html.Div([
+            dcc.Input(id='email', type='text', placeholder='Email', className="form-input"),
+            dcc.Input(id='pwd', type='password', placeholder='Mot de passe', className="form-input"),
+            dcc.Input(id='otp', type='text', placeholder='Code Google Auth', className="form-input"),
+            dcc.Checklist(id='remember-me', options=[{'label': 'Remember me', 'value': 'remember'}], value=[]),
+            html.Button('Connect', id='login-button', n_clicks=0, className="btn-primary"),
+        ], className="form-stack"), 
+        
+        html.Div(id='login-error', className="error-msg")
+    ], className="card login-card")
+], className="page-wrapper center-content")
+
+
+# Navigation bar, only visible if connected
+def navbar() -> html.Nav:
+    """
+    Create the navigation bar for the application.
+    
+    Generates a navigation bar with links to different sections of the app
+    that is only visible when a user is authenticated.
+    
+    Returns:
+        html.Nav: The navigation bar component
+    """
+    return html.Nav([
+        dcc.Link('Home', href='/home', className="nav-link"),
+        dcc.Link('Add', href='/edit', className="nav-link"),
+        dcc.Link('Search', href='/viz', className="nav-link"),
+        dcc.Link('Write', href='/writer', className="nav-link"),
+        html.A('Sign out', href='/logout', className="nav-link logout-btn")
+    ], className="navbar")
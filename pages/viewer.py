@@ -19,24 +19,31 @@ def get_all_inputs():
     return inputs
 
 
-# fill combobox
-inputs = get_all_inputs()
-
-layout = html.Div([
-    html.H1("Idea explorer"),
-    html.Div([
-        dcc.Dropdown(id='input-name', placeholder='Idea / Notes...', options=inputs),
-        html.Button('See connections', id='btn-submit', n_clicks=0, className="btn-primary"),
-    ]),
-    html.Div(id='node-info'),
-    dash_table.DataTable(
-        id="table-viz-data",
-        style_table={'overflowX': 'auto'},
-        columns=[{"name": "Name", "id": "name"}, {"name": "Description", "id": "description"}],
-        data=[],
-        style_cell={'textAlign': 'left'},
-        page_size=10)
-], className="content-container")
+def layout() -> html.Div:
+    """
+    Build the explorer page.
+    
+    Built on each visit rather than at import, so that the dropdown lists the
+    current data and tags and importing the page does not query the database.
+    
+    Returns:
+        html.Div: The explorer page layout
+    """
+    return html.Div([
+        html.H1("Idea explorer"),
+        html.Div([
+            dcc.Dropdown(id='input-name', placeholder='Idea / Notes...', options=get_all_inputs()),
+            html.Button('See connections', id='btn-submit', n_clicks=0, className="btn-primary"),
+        ]),
+        html.Div(id='node-info'),
+        dash_table.DataTable(
+            id="table-viz-data",
+            style_table={'overflowX': 'auto'},
+            columns=[{"name": "Name", "id": "name"}, {"name": "Description", "id": "description"}],
+            data=[],
+            style_cell={'textAlign': 'left'},
+            page_size=10)
+    ], className="content-container")
 
 @callback(
     Output('node-info', 'children'),
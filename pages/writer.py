@@ -3,6 +3,7 @@ import utils
 import json
 import os
 from data_similarity import DataSimilarity
+from data_handler import flush_embeddings
 from typing import List, Dict, Any, Union
 
 # Path to store the cached TOC content
@@ -112,7 +113,8 @@ def render_toc_from_structure(structure) -> html.Div:
             return html.Li(section_content)
         else:
             # final idea
-            text = utils.unformat_text(node['title'], node["text"])
+            # TOCs cached before descriptions were stored only have the embedded text
+            text = node["description"] if "description" in node else utils.unformat_text(node['title'], node["text"])
             full_text = node['title'] + " : " + text
             
             return html.Li([
@@ -183,6 +185,8 @@ def update_toc(n_clicks: int) -> Union[html.Div, Any]:
             return render_toc_from_structure(cached_structure)
     
     # Generate new structure (either on first load with no cache, or on button click)
+    # Ideas saved a moment ago may still be waiting to be embedded
+    flush_embeddings()
     toc_builder = DataSimilarity()
     print("generate_toc_structure")
     structure = toc_builder.generate_toc_structure()
@@ -0,0 +1,121 @@
+import importlib
+import json
+import sys
+import threading
+from pathlib import Path
+
+import numpy as np
+import pyotp
+import pytest
+from argon2 import PasswordHasher
+from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
+
+# Make the application modules importable from the tests
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import authenticator
+import data_handler
+from chroma_client import ChromaClient
+
+TEST_EMAIL = "user@example.com"
+TEST_PASSWORD = "correct horse battery staple"
+
+
+@pytest.fixture
+def auth_files(tmp_path, monkeypatch):
+    """
+    Create the user and server configuration files in a temporary working directory.
+    
+    Returns:
+        dict: 'email', 'pwd' and 'otp_secret' of the configured user
+    """
+    (tmp_path / "data").mkdir()
+    otp_secret = pyotp.random_base32()
+    user = {"email": TEST_EMAIL, "pwd_hash": PasswordHasher().hash(TEST_PASSWORD), "otp_secret": otp_secret}
+    (tmp_path / "data" / "users.json").write_text(json.dumps(user))
+    (tmp_path / "data" / "server.json").write_text(json.dumps({"secret_key": "test-secret"}))
+    monkeypatch.chdir(tmp_path)
+    # Parsed files are cached by relative path, which every test reuses
+    authenticator._json_cache.clear()
+    return {"email": TEST_EMAIL, "pwd": TEST_PASSWORD, "otp_secret": otp_secret}
+
+
+@pytest.fixture
+def app_module(auth_files, monkeypatch):
+    """
+    Import the Dash application with fresh OTP state and the debug bypass disabled.
+    
+    Returns:
+        module: The app module
+    """
+    app = importlib.import_module("app")
+    monkeypatch.setattr(app, "_DEBUG", False)
+    monkeypatch.setattr(app, "_otp_attempts", {})
+    monkeypatch.setattr(app, "_last_consumed_step", {})
+    return app
+
+
+class FakeSentenceModel:
+    """
+    Stand-in for the SentenceTransformer model: letter counts as embeddings.
+    
+    Texts sharing most of their letters get close embeddings, and nothing is
+    downloaded. Every encoded batch is recorded in `calls`.
+    """
+    def __init__(self) -> None:
+        self.calls: list[list[str]] = []
+
+    def encode(self, texts, normalize_embeddings: bool = False, **kwargs) -> np.ndarray:
+        self.calls.append(list(texts))
+        vectors = np.ones((len(texts), 27), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for char in text.lower():
+                if "a" <= char <= "z":
+                    vectors[row, ord(char) - ord("a")] += 1
+        if normalize_embeddings:
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    """
+    Register a FakeSentenceModel as the loaded embedding model.
+    
+    Returns:
+        FakeSentenceModel: The model used by every ChromaClient of the test
+    """
+    model = FakeSentenceModel()
+    monkeypatch.setitem(SentenceTransformerEmbeddingFunction.models, "all-distilroberta-v1", model)
+    return model
+
+
+@pytest.fixture
+def chroma(fake_model, tmp_path):
+    """
+    Create a ChromaClient on a temporary database, embedding with the fake model.
+    
+    Returns:
+        ChromaClient: The client
+    """
+    return ChromaClient(db_path=str(tmp_path / "embeddings"))
+
+
+@pytest.fixture
+def database(chroma, tmp_path, monkeypatch):
+    """
+    Point data_handler at a fresh SQLite database and the test ChromaClient.
+    
+    Returns:
+        module: The data_handler module
+    """
+    (tmp_path / "data").mkdir(exist_ok=True)
+    monkeypatch.chdir(tmp_path)
+    # Connections are per thread and the schema is created once per process
+    monkeypatch.setattr(data_handler, "_local", threading.local())
+    monkeypatch.setattr(data_handler, "_db_initialized", False)
+    monkeypatch.setattr(data_handler, "get_chroma_client", lambda: chroma)
+    data_handler.ensure_database()
+    yield data_handler
+    data_handler.flush_embeddings()
+    data_handler._local.conn.close()
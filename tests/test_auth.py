@@ -0,0 +1,73 @@
+import pyotp
+import pytest
+
+
+def _login(app_module, auth_files, otp, email=None, pwd=None):
+    """Run the login callback inside a request context, with the configured credentials by default."""
+    email = auth_files["email"] if email is None else email
+    pwd = auth_files["pwd"] if pwd is None else pwd
+    with app_module.server.test_request_context("/"):
+        return app_module.auth_login(1, email, pwd, otp, [])
+
+
+def test_login_accepts_valid_credentials(app_module, auth_files):
+    valid = pyotp.TOTP(auth_files["otp_secret"]).now()
+    assert _login(app_module, auth_files, valid) == ("/", "")
+
+
+@pytest.mark.parametrize("email, pwd", [
+    ("other@example.com", None),
+    (None, "wrong password"),
+    ("", ""),
+])
+def test_login_rejects_wrong_credentials(app_module, auth_files, email, pwd):
+    valid = pyotp.TOTP(auth_files["otp_secret"]).now()
+    assert _login(app_module, auth_files, valid, email=email, pwd=pwd)[1] == "Identifiants incorrects"
+
+
+def test_login_rejects_empty_fields(app_module, auth_files):
+    # Dash sends None for fields that were never filled in
+    valid = pyotp.TOTP(auth_files["otp_secret"]).now()
+    with app_module.server.test_request_context("/"):
+        assert app_module.auth_login(1, None, None, valid, [])[1] == "Identifiants incorrects"
+
+
+def test_otp_rate_limit_rejects_valid_code_after_failures(app_module, auth_files):
+    for _ in range(app_module.OTP_MAX_ATTEMPTS):
+        assert _login(app_module, auth_files, "000000")[1] == "Code OTP invalide"
+    valid = pyotp.TOTP(auth_files["otp_secret"]).now()
+    assert _login(app_module, auth_files, valid)[1] == "Trop de tentatives, réessayez plus tard"
+
+
+def test_otp_rate_limit_expires_after_window(app_module, auth_files):
+    now = 1_000_000.0
+    for _ in range(app_module.OTP_MAX_ATTEMPTS):
+        assert not app_module._verify_otp(auth_files["email"], "000000", now)
+    assert app_module._otp_rate_limited(auth_files["email"], now)
+    assert not app_module._otp_rate_limited(auth_files["email"], now + app_module.OTP_ATTEMPT_WINDOW + 1)
+
+
+def test_otp_code_cannot_be_replayed(app_module, auth_files):
+    now = 1_000_000.0
+    code = pyotp.TOTP(auth_files["otp_secret"]).at(now)
+    assert app_module._verify_otp(auth_files["email"], code, now)
+    assert not app_module._verify_otp(auth_files["email"], code, now + 1)
+
+
+def test_debug_bypass_does_not_count_attempts(app_module, auth_files, monkeypatch):
+    monkeypatch.setattr(app_module, "_DEBUG", True)
+    for _ in range(app_module.OTP_MAX_ATTEMPTS + 2):
+        assert _login(app_module, auth_files, "000000") == ("/", "")
+    assert auth_files["email"] not in app_module._otp_attempts
+
+
+def test_wrong_passwords_are_rate_limited(app_module, auth_files, monkeypatch):
+    for pwd in ["wrong"] * (app_module.OTP_MAX_ATTEMPTS - 1):
+        assert _login(app_module, auth_files, "000000", pwd=pwd)[1] == "Identifiants incorrects"
+    # A different email still counts against the single account
+    assert _login(app_module, auth_files, "000000", email="other@example.com")[1] == "Identifiants incorrects"
+
+    # Once limited, the password hash is not even verified
+    monkeypatch.setattr(app_module.authenticator, "check_credentials", lambda email, pwd: pytest.fail("verified"))
+    valid = pyotp.TOTP(auth_files["otp_secret"]).now()
+    assert _login(app_module, auth_files, valid)[1] == "Trop de tentatives, réessayez plus tard"
@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+import authenticator
+
+
+@pytest.fixture
+def legacy_user(auth_files, tmp_path):
+    """
+    Replace the user file with one holding a plain password, as written before hashing.
+    
+    Returns:
+        dict: 'email', 'pwd' and 'otp_secret' of the configured user
+    """
+    user = {"email": auth_files["email"], "pwd": auth_files["pwd"], "otp_secret": auth_files["otp_secret"]}
+    (tmp_path / "data" / "users.json").write_text(json.dumps(user))
+    authenticator._json_cache.clear()
+    return auth_files
+
+
+def test_hashed_password_is_verified(auth_files):
+    assert authenticator.check_credentials(auth_files["email"], auth_files["pwd"])
+    assert not authenticator.check_credentials(auth_files["email"], "wrong password")
+    assert not authenticator.check_credentials("other@example.com", auth_files["pwd"])
+    assert not authenticator.check_credentials(None, None)
+
+
+def test_plain_password_still_accepted(legacy_user):
+    assert authenticator.check_credentials(legacy_user["email"], legacy_user["pwd"])
+    assert not authenticator.check_credentials(legacy_user["email"], "wrong password")
+    assert not authenticator.check_credentials("other@example.com", legacy_user["pwd"])
+    assert not authenticator.check_credentials(None, None)
+
+
+def test_generated_user_stores_only_a_hash(tmp_path, monkeypatch):
+    (tmp_path / "data").mkdir()
+    monkeypatch.chdir(tmp_path)
+    authenticator._json_cache.clear()
+
+    authenticator.generate_auth_link("new@example.com", "s3cret", debug=False)
+
+    user = json.loads((tmp_path / "data" / "users.json").read_text())
+    assert "pwd" not in user
+    assert user["pwd_hash"].startswith("$argon2id$")
+    assert authenticator.check_credentials("new@example.com", "s3cret")
+
+
+def test_corrupted_hash_rejects_login(auth_files, tmp_path):
+    path = tmp_path / "data" / "users.json"
+    user = json.loads(path.read_text())
+    user["pwd_hash"] = "not an argon2 hash"
+    path.write_text(json.dumps(user))
+    authenticator._json_cache.clear()
+
+    assert not authenticator.check_credentials(auth_files["email"], auth_files["pwd"])
+
+
+def test_json_layout_does_not_depend_on_orjson(monkeypatch):
+    user = {"email": "new@example.com", "pwd_hash": "$argon2id$...", "otp_secret": "ABC"}
+    written = authenticator._dumps(user)
+    monkeypatch.setattr(authenticator, "orjson", None)
+    assert authenticator._dumps(user) == written
@@ -0,0 +1,54 @@
+import pytest
+
+import chroma_client
+from chroma_client import ChromaClient
+
+
+def _count_queries(client, monkeypatch):
+    """Record every search sent to the Chroma collection."""
+    calls = []
+    query = client.collection.query
+
+    def counting_query(*args, **kwargs):
+        calls.append(kwargs.get("n_results"))
+        return query(*args, **kwargs)
+
+    monkeypatch.setattr(client.collection, "query", counting_query)
+    return calls
+
+
+def test_query_cache_matches_on_requested_size(chroma, monkeypatch):
+    chroma.insert_many([("apple", "red fruit"), ("banana", "yellow fruit"), ("cherry", "small red fruit")])
+    calls = _count_queries(chroma, monkeypatch)
+    chroma.get_similar_data("query", "red fruit", n_results=1)
+    chroma.get_similar_data("query", "red fruit", n_results=2)
+    assert len(chroma.get_similar_data("query", "red fruit", n_results=2)) == 2
+    assert calls == [1, 2]
+
+
+def test_query_cache_sees_writes_from_other_clients(chroma, monkeypatch, tmp_path):
+    chroma.insert_many([("apple", "red fruit"), ("banana", "yellow fruit")])
+    assert [r["name"] for r in chroma.get_similar_data("query", "red fruit", n_results=5)] == ["apple", "banana"]
+    # Another worker writing to the same database
+    ChromaClient(db_path=str(tmp_path / "embeddings")).insert_data("cherry", "red fruit too")
+    names = {r["name"] for r in chroma.get_similar_data("query", "red fruit", n_results=5)}
+    assert names == {"apple", "banana", "cherry"}
+
+
+def test_query_cache_returns_independent_copies(chroma):
+    chroma.insert_many([("apple", "red fruit"), ("banana", "yellow fruit")])
+    first = chroma.get_similar_data("query", "red fruit", n_results=2)
+    first[0]["description"] = "changed"
+    first.clear()
+    assert chroma.get_similar_data("query", "red fruit", n_results=2)[0]["description"] == "red fruit"
+
+
+@pytest.mark.parametrize("value", ["", "abc", "0", "-2"])
+def test_invalid_thread_count_falls_back_to_cpus(monkeypatch, value):
+    monkeypatch.setenv("OMP_NUM_THREADS", value)
+    assert chroma_client._threads_from_env("OMP_NUM_THREADS") == chroma_client.NUM_THREADS
+
+
+def test_thread_count_read_from_env(monkeypatch):
+    monkeypatch.setenv("OMP_NUM_THREADS", "3")
+    assert chroma_client._threads_from_env("OMP_NUM_THREADS") == 3
@@ -0,0 +1,107 @@
+import sqlite3
+
+from config import NAME_DB
+
+
+def test_description_update_is_visible(database):
+    database.add_data("apple", "a red fruit")
+    assert database.get_description("apple") == "a red fruit"
+
+    database.update_data("apple", "a green fruit")
+
+    assert database.get_description("apple") == "a green fruit"
+
+
+def test_reads_see_writes_from_other_connections(database):
+    database.add_data("apple", "a red fruit")
+    database.add_tag("fruit")
+    assert database.get_description("apple") == "a red fruit"
+    assert database.get_tags_from_data("apple") == []
+
+    # Another process writes through its own connection
+    other = sqlite3.connect(NAME_DB)
+    with other:
+        other.execute("UPDATE data SET description = ? WHERE name = ?", ("a green fruit", "apple"))
+        other.execute("INSERT INTO relation (data_name, tag_name) VALUES (?, ?)", ("apple", "fruit"))
+    other.close()
+
+    assert database.get_description("apple") == "a green fruit"
+    assert database.get_tags_from_data("apple") == ["fruit"]
+
+
+def test_add_data_many_keeps_first_duplicate(database):
+    database.add_data("apple", "a red fruit")
+
+    database.add_data_many([
+        ("apple", "replaced"),
+        ("banana", "a yellow fruit"),
+        ("banana", "a second banana"),
+        ("cherry", "a small fruit"),
+    ])
+
+    assert database.get_description("apple") == "a red fruit"
+    assert database.get_description("banana") == "a yellow fruit"
+    assert database.get_description("cherry") == "a small fruit"
+    database.flush_embeddings()
+    stored = database.get_chroma_client().collection.get(ids=["banana"])
+    assert stored["metadatas"] == [{"name": "banana", "description": "a yellow fruit"}]
+
+
+def test_add_relation_many_ignores_existing(database):
+    database.add_data_many([("apple", "a red fruit"), ("banana", "a yellow fruit")])
+    database.add_tag("fruit")
+    database.add_tag("red")
+    database.add_relation("apple", "fruit")
+
+    database.add_relation_many([("apple", "fruit"), ("apple", "red"), ("banana", "fruit"), ("banana", "fruit")])
+
+    assert sorted(database.get_tags_from_data("apple")) == ["fruit", "red"]
+    assert database.get_tags_from_data("banana") == ["fruit"]
+
+
+def test_flush_embeddings_applies_queued_writes_in_order(database, chroma, monkeypatch):
+    upserts = []
+    upsert_many = chroma.upsert_many
+    monkeypatch.setattr(chroma, "upsert_many", lambda items: upserts.append(list(items)) or upsert_many(items))
+    # Leave time for every write below to join the same batch
+    monkeypatch.setattr(database, "EMBED_FLUSH_DELAY", 1.0)
+
+    database.add_data("apple", "a red fruit")
+    database.add_data("banana", "a yellow fruit")
+    database.update_data("banana", "a long yellow fruit")
+    database.remove_data("apple")
+    database.flush_embeddings()
+
+    stored = chroma.collection.get()
+    assert stored["ids"] == ["banana"]
+    assert stored["metadatas"] == [{"name": "banana", "description": "a long yellow fruit"}]
+    # The consecutive upserts were sent together, the latest description winning
+    assert upserts[0] == [("apple", "a red fruit"), ("banana", "a long yellow fruit")]
+
+
+def test_embedding_worker_survives_a_failing_batch(database, chroma, monkeypatch):
+    def unavailable():
+        raise RuntimeError("model failed to load")
+
+    with monkeypatch.context() as m:
+        m.setattr(database, "get_chroma_client", unavailable)
+        database.add_data("apple", "a red fruit")
+        database.flush_embeddings()
+
+    database.add_data("banana", "a yellow fruit")
+    database.flush_embeddings()
+
+    assert database._embedding_worker.is_alive()
+    assert chroma.collection.get()["ids"] == ["banana"]
+
+
+def test_flush_embeddings_restarts_a_dead_worker(database, chroma):
+    database.add_data("banana", "a yellow fruit")
+    database._stop_embedding_worker()
+    assert not database._embedding_worker.is_alive()
+    # A write left in the queue once the worker is gone
+    database._embedding_queue.put(("upsert", "apple", "a red fruit"))
+
+    database.flush_embeddings()
+
+    assert sorted(chroma.collection.get()["ids"]) == ["apple", "banana"]
@@ -0,0 +1,61 @@
+import pytest
+
+import data_similarity
+from data_similarity import DataSimilarity
+
+FRUITS = [
+    ("apple", "a crisp red fruit"),
+    ("banana", "a long yellow fruit"),
+    ("cherry", "a small red fruit with a stone"),
+    ("grape", "a small green or purple fruit"),
+]
+
+
+@pytest.fixture
+def toc_client(chroma, monkeypatch):
+    """
+    Fill the test ChromaClient and make it the one the TOC is built from.
+    
+    Returns:
+        ChromaClient: The client
+    """
+    chroma.insert_many(FRUITS)
+    monkeypatch.setattr(data_similarity, "get_chroma_client", lambda: chroma)
+    monkeypatch.setattr(DataSimilarity, "_toc_cache", {})
+    return chroma
+
+
+def _idea_ids(toc: list) -> list[str]:
+    """Names of every idea in a TOC, in order."""
+    ids = []
+    for node in toc:
+        if node["type"] == "idea":
+            ids.append(node["id"])
+        else:
+            ids.extend(_idea_ids(node["children"]))
+    return ids
+
+
+def test_toc_reused_until_collection_changes(toc_client, monkeypatch):
+    toc = DataSimilarity().generate_toc_structure()
+    assert sorted(_idea_ids(toc)) == sorted(name for name, _ in FRUITS)
+
+    # Unchanged collection: the data is not read again
+    with monkeypatch.context() as m:
+        m.setattr(toc_client, "iter_all_data", pytest.fail)
+        assert DataSimilarity().generate_toc_structure() == toc
+
+    toc_client.insert_data("melon", "a large sweet fruit")
+    assert "melon" in _idea_ids(DataSimilarity().generate_toc_structure())
+
+
+def test_cached_toc_is_not_shared_with_callers(toc_client):
+    toc = DataSimilarity().generate_toc_structure()
+    expected = _idea_ids(toc)
+    toc.clear()
+
+    again = DataSimilarity().generate_toc_structure()
+    assert _idea_ids(again) == expected
+    again[0].clear()
+
+    assert _idea_ids(DataSimilarity().generate_toc_structure()) == expected
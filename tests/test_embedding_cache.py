@@ -0,0 +1,59 @@
+import numpy as np
+
+from chroma_client import CachedEmbeddingFunction
+
+MODEL = "all-distilroberta-v1"
+
+
+def test_repeated_documents_are_encoded_once(fake_model):
+    emb_fn = CachedEmbeddingFunction(model_name=MODEL)
+
+    first = emb_fn(["apple", "banana"])
+    # A mixed batch only encodes the new text, even when it is repeated
+    second = emb_fn(["banana", "cherry", "cherry", "apple"])
+
+    assert fake_model.calls == [["apple", "banana"], ["cherry"]]
+    np.testing.assert_array_equal(second[0], first[1])
+    np.testing.assert_array_equal(second[3], first[0])
+    np.testing.assert_array_equal(second[1], second[2])
+
+
+def test_least_recently_used_embedding_is_evicted(fake_model):
+    emb_fn = CachedEmbeddingFunction(model_name=MODEL, cache_size=2)
+
+    emb_fn(["apple"])
+    emb_fn(["banana"])
+    emb_fn(["apple"])
+    emb_fn(["cherry"])
+    fake_model.calls.clear()
+
+    emb_fn(["apple", "cherry"])
+    assert fake_model.calls == []
+    emb_fn(["banana"])
+    assert fake_model.calls == [["banana"]]
+
+
+def test_disk_cache_survives_a_restart(fake_model, tmp_path):
+    cache_path = str(tmp_path / "embedding_cache.sqlite3")
+    first = CachedEmbeddingFunction(model_name=MODEL, cache_path=cache_path)(["apple", "banana"])
+    fake_model.calls.clear()
+
+    # A new instance starts with an empty memory cache
+    restarted = CachedEmbeddingFunction(model_name=MODEL, cache_path=cache_path)
+    again = restarted(["banana", "apple", "cherry"])
+
+    assert fake_model.calls == [["cherry"]]
+    np.testing.assert_array_equal(again[0], first[1])
+    np.testing.assert_array_equal(again[1], first[0])
+    assert again[0].dtype == np.float32
+
+
+def test_disk_cache_is_separate_per_backend(fake_model, tmp_path):
+    cache_path = str(tmp_path / "embedding_cache.sqlite3")
+    CachedEmbeddingFunction(model_name=MODEL, cache_path=cache_path)(["apple"])
+    fake_model.calls.clear()
+
+    CachedEmbeddingFunction(model_name=MODEL, cache_path=cache_path, backend="onnx")(["apple"])
+    CachedEmbeddingFunction(model_name=MODEL, cache_path=cache_path, model_kwargs={"torch_dtype": "float16"})(["apple"])
+
+    assert fake_model.calls == [["apple"], ["apple"]]
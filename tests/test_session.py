@@ -0,0 +1,26 @@
+import pytest
+
+
+def _save_modified_session(app_module, path):
+    """Modify the session while handling `path` and return the response headers it produces."""
+    server = app_module.server
+    interface = server.session_interface
+    with server.test_request_context(path) as ctx:
+        session = interface.open_session(server, ctx.request)
+        session["user"] = "someone"
+        response = server.response_class()
+        interface.save_session(server, session, response)
+        return response.headers
+
+
+@pytest.mark.parametrize("path", ["/login", "/assets/style.css", "/_dash-layout", "/_dash-component-suites/dash/dash.js"])
+def test_public_paths_do_not_set_cookies(app_module, path):
+    headers = _save_modified_session(app_module, path)
+    assert "Set-Cookie" not in headers
+    assert "Vary" not in headers
+
+
+@pytest.mark.parametrize("path", ["/", "/viewer", "/_dash-update-component"])
+def test_other_paths_save_the_session(app_module, path):
+    headers = _save_modified_session(app_module, path)
+    assert headers["Set-Cookie"].startswith(app_module.server.config["SESSION_COOKIE_NAME"] + "=")
@@ -12,14 +12,15 @@ def format_text(name: str, description: str) -> str:
         Returns:
             str: Formatted string combining name and description
         """
-        return f"{name}. {name}: {description}"
+        return f"{name}: {description}"
     
 def unformat_text(name: str, description: str) -> str:
     """
     Unformat text from the embedding database storage format.
     
-    Reverses the formatting applied by format_text, extracting the original
-    description from the stored formatted string.
+    Reverses the formatting applied by format_text by stripping the leading
+    "<name>: " prefix from the stored formatted string. Documents stored with
+    the former "<name>. <name>: " prefix are handled as well.
     
     Args:
         name (str): The name/title of the data item
@@ -28,4 +29,7 @@ def unformat_text(name: str, description: str) -> str:
     Returns:
         str: Extracted original description
     """
-    return description.replace(f"{name}. {name}:", "")
\ No newline at end of file
+    prefix = f"{name}: "
+    if description.startswith(prefix):
+        return description[len(prefix):]
+    return description.removeprefix(f"{name}. {name}: ")
\ No newline at end of file